@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+import heapq
+import itertools
+import math
+
+class Beam:
+    '''
+    This class implements beam pruning of complete edges per chart
+    cell
+
+    Two criteria can be used, separately or together:
+
+    - threshold: an edge is pruned if its probability is less than
+      threshold times the probability of the best complete edge seen
+      so far for the same cell and LHS (i.e. with the same start, end
+      and LHS). Comparing only edges with the same LHS keeps a unary
+      projection such as NP -> N from being pruned by its own
+      daughter, which is always more probable.
+    - top_k: for every cell and LHS, only the top_k most probable
+      edges seen so far are kept. If a better edge comes along when
+      top_k edges are kept already, the least probable one is
+      displaced.
+
+    Only complete edges are subject to pruning; the scores of
+    incomplete edges are not comparable to those of complete ones.
+    '''
+
+    threshold = None    # Relative probability threshold, or None
+    top_k = None        # Maximum number of edges per cell and LHS, or None
+    log_space = False   # True if edges are scored with log-probabilities
+    best = None         # Dictionary: (start, end, LHS) (key), best score
+                        # (value)
+    kept = None         # Dictionary: (start, end, LHS) (key), min-heap of
+                        # (score, sequence number, edge) (value)
+    counter = None      # Source of sequence numbers for tie-breaking
+    pruned_by_threshold = 0
+    pruned_by_top_k = 0 # Edges rejected or displaced by top_k
+
+    def __init__(self, threshold=None, top_k=None, log_space=False):
+        self.threshold = threshold
+        self.top_k = top_k
+        self.log_space = log_space
+        self.best = {}
+        self.kept = {}
+        self.counter = itertools.count()
+
+    def admit(self, edge):
+        '''
+        Decide whether a complete edge is inside the beam
+
+        Returns a pair (admitted, displaced): admitted is True if the
+        edge should be added to the queue, and displaced is an edge
+        admitted earlier that fell out of the beam because of the new
+        edge, or None.
+        '''
+        score = edge.get_prob()
+        cell = (edge.get_start(), edge.get_end(), edge.get_prod_rule().get_lhs())
+
+        if self.threshold is not None:
+            best = self.best.get(cell)
+            if best is not None and score < self.scale(best):
+                self.pruned_by_threshold += 1
+                return False, None
+            if best is None or score > best:
+                self.best[cell] = score
+
+        displaced = None
+        if self.top_k is not None:
+            kept = self.kept.setdefault(cell, [])
+            entry = (score, next(self.counter), edge)
+            if len(kept) < self.top_k:
+                heapq.heappush(kept, entry)
+            elif score > kept[0][0]:
+                displaced = heapq.heapreplace(kept, entry)[2]
+                self.pruned_by_top_k += 1
+            else:
+                self.pruned_by_top_k += 1
+                return False, None
+        return True, displaced
+
+    def replace(self, edge, new_edge):
+        '''
+        Put new_edge in the place of an admitted edge with the same
+        span and LHS, e.g. a more probable derivation of the same item
+        that takes over from it in the queue
+        '''
+        score = new_edge.get_prob()
+        cell = (edge.get_start(), edge.get_end(), edge.get_prod_rule().get_lhs())
+        if self.threshold is not None:
+            best = self.best.get(cell)
+            if best is None or score > best:
+                self.best[cell] = score
+        if self.top_k is not None:
+            kept = self.kept.get(cell, [])
+            for i, (_, number, kept_edge) in enumerate(kept):
+                if kept_edge is edge:
+                    kept[i] = (score, number, new_edge)
+                    heapq.heapify(kept)
+                    break
+
+    def scale(self, score):
+        '''
+        Return the lowest score within the threshold of a given score
+        '''
+        if self.log_space:
+            return score + math.log(self.threshold) if self.threshold > 0 else float('-inf')
+        return score * self.threshold
+
+    def get_stats(self):
+        '''
+        Return a dictionary of pruning statistics
+        '''
+        return {'pruned_by_threshold': self.pruned_by_threshold,
+                'pruned_by_top_k': self.pruned_by_top_k}
@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+
+'''
+Benchmark the parser across strategies and grammars
+
+For every grammar, fixed sets of sentences of increasing length are
+sampled from the grammar itself with a seeded random number
+generator, so the same sentences are used on every run. Every
+combination of grammar and strategy is then run in a fresh Python
+process, which measures:
+
+- the time it takes to create the parser (i.e. to load the grammar)
+- per sentence: wall time, iterations, edges created, edges rejected
+  (duplicates, or pruned by the beam), peak queue size and number of
+  edges in the chart
+- the peak memory (maximum resident set size) of the process
+
+The results are written to a JSON file so that runs can be compared.
+
+Example:
+    python benchmark.py -g sample.pcfg -s fifo bestfirst astar -o results.json
+'''
+
+import argparse
+import json
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+from bottom_up_chart_parser import BottomUpChartParser
+from grammar import Grammar, GOAL_SYMBOL
+from parse_exception import ParseException
+from queue_exception import QueueException
+
+DEFAULT_GRAMMARS = ['sample.pcfg', 'english.pcfg']
+DEFAULT_STRATEGIES = ['fifo', 'bestfirst', 'astar', 'altsearch', 'cky']
+DEFAULT_LENGTHS = {'sample.pcfg': [3, 5, 7, 9],
+                   'english.pcfg': [3, 5, 8]}
+OTHER_LENGTHS = [3, 5, 8]   # Lengths for grammars not listed above
+MAX_DEPTH = 40              # Samples deeper than this are discarded
+MAX_ATTEMPTS = 20000        # Samples drawn per length before giving up
+
+def index_rules_by_lhs(grammar):
+    '''
+    Return a dictionary mapping every non-terminal to a list of
+    (RHS, probability) pairs of its rules, including lexical ones, in
+    a fixed order
+    '''
+    rules = {}
+    for key in sorted(grammar.rules):
+        for prod_rule in grammar.rules[key]:
+            rules.setdefault(prod_rule.get_lhs(), []).append((prod_rule.get_rhs(), prod_rule.get_prob()))
+    for prod_rule in grammar.iter_lexical_rules():
+        rules.setdefault(prod_rule.get_lhs(), []).append((prod_rule.get_rhs(), prod_rule.get_prob()))
+    return rules
+
+def sample_sentence(rules, rng, max_length):
+    '''
+    Sample a sentence top-down from the rules of a grammar (see
+    index_rules_by_lhs); returns None if the sentence becomes longer
+    than max_length or the derivation deeper than MAX_DEPTH
+    '''
+    words = []
+    agenda = [(GOAL_SYMBOL, 0)]
+    while agenda:
+        symbol, depth = agenda.pop()
+        if symbol not in rules:
+            words.append(symbol)
+            if len(words) > max_length:
+                return None
+            continue
+        if depth > MAX_DEPTH:
+            return None
+        point = rng.random() * sum(prob for rhs, prob in rules[symbol])
+        for rhs, prob in rules[symbol]:
+            point -= prob
+            if point <= 0:
+                break
+        agenda.extend((child, depth+1) for child in reversed(rhs))
+    return ' '.join(words)
+
+def sample_sentences(grammar_file, lengths, per_length, seed):
+    '''
+    Return a dictionary mapping every length to a list of per_length
+    distinct sentences of exactly that length sampled from a grammar
+    '''
+    rules = index_rules_by_lhs(Grammar(grammar_file))
+    rng = random.Random(seed)
+    sentences = {}
+    for length in lengths:
+        found = []
+        for _ in xrange(MAX_ATTEMPTS):
+            sentence = sample_sentence(rules, rng, length)
+            if sentence is not None and len(sentence.split()) == length \
+                    and sentence not in found:
+                found.append(sentence)
+                if len(found) == per_length:
+                    break
+        sentences[length] = found
+    return sentences
+
+def run_config(config):
+    '''
+    Parse all sentences of a configuration and return the measurements
+
+    This is run in a separate process for every configuration (see
+    run_in_subprocess), so that peak memory and grammar load time are
+    not affected by other configurations.
+    '''
+    start = time.time()
+    parser = BottomUpChartParser(config['grammar'], config['log_space'],
+                                 binarize=config['binarize'],
+                                 collapse_unaries=config['collapse_unaries'],
+                                 left_corner_filter=config['left_corner_filter'],
+                                 lookahead_filter=config['lookahead_filter'])
+    load_time = time.time() - start
+    parser.time_limit = config['time_limit']
+
+    results = []
+    for sentence in config['sentences']:
+        result = {'sentence': sentence, 'length': len(sentence.split()), 'error': None}
+        start = time.time()
+        try:
+            parser.parse(sentence, config['number_of_parses'], config['strategy'])
+        except (ParseException, QueueException) as e:
+            result['error'] = e.value
+        result['time'] = time.time() - start
+        if result['error'] is None:
+            s_edges = parser.chart.get_s_edges()
+            result['best_prob'] = max(edge.get_prob() for edge in s_edges) if s_edges else None
+            stats = parser.stats.as_dict()
+            del stats['cell_sizes']
+            result.update(stats)
+        results.append(result)
+
+    return {'grammar': config['grammar'],
+            'strategy': config['strategy'],
+            'load_time': load_time,
+            'peak_memory_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            'sentences': results}
+
+def run_in_subprocess(config):
+    '''
+    Run a configuration in a fresh Python process and return its
+    measurements
+    '''
+    process = subprocess.Popen([sys.executable, __file__, '--worker'],
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    output = process.communicate(json.dumps(config))[0]
+    if process.returncode != 0:
+        raise RuntimeError('Benchmark of %s with %s failed' % (config['grammar'], config['strategy']))
+    return json.loads(output)
+
+def summarize(result):
+    '''
+    Return the total time and iterations of a configuration per
+    sentence length
+    '''
+    summary = {}
+    for sentence in result['sentences']:
+        totals = summary.setdefault(str(sentence['length']),
+                                    {'sentences': 0, 'errors': 0, 'time': 0.0, 'iterations': 0})
+        totals['sentences'] += 1
+        totals['time'] += sentence['time']
+        if sentence['error'] is None:
+            totals['iterations'] += sentence['iterations']
+        else:
+            totals['errors'] += 1
+    return summary
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description='Benchmark the parser across strategies and grammars.')
+    arg_parser.add_argument('-g', '--grammars', nargs='+', default=DEFAULT_GRAMMARS,
+                            help='grammar files (default: %s)' % ' '.join(DEFAULT_GRAMMARS))
+    arg_parser.add_argument('-s', '--strategies', nargs='+', default=DEFAULT_STRATEGIES,
+                            help='parsing strategies (default: %s)' % ' '.join(DEFAULT_STRATEGIES))
+    arg_parser.add_argument('-l', '--lengths', type=int, nargs='+', default=None,
+                            help='sentence lengths (default: depends on the grammar)')
+    arg_parser.add_argument('-k', '--per-length', type=int, default=3,
+                            help='number of sentences per length (default: 3)')
+    arg_parser.add_argument('-n', '--number-of-parses', type=int, default=1,
+                            help='number of parses per sentence (default: 1)')
+    arg_parser.add_argument('-t', '--time-limit', type=float, default=60,
+                            help='maximum number of seconds per sentence (default: 60)')
+    arg_parser.add_argument('--seed', type=int, default=0,
+                            help='seed for sampling sentences (default: 0)')
+    arg_parser.add_argument('--log-space', action='store_true',
+                            help='score edges with log-probabilities')
+    arg_parser.add_argument('--binarize', action='store_true',
+                            help='parse with a binarized grammar')
+    arg_parser.add_argument('--collapse-unaries', action='store_true',
+                            help='apply chains of unary rules in a single step')
+    arg_parser.add_argument('--left-corner-filter', action='store_true',
+                            help='filter predictions with the left-corner closure')
+    arg_parser.add_argument('--lookahead-filter', action='store_true',
+                            help='filter edges with one-token lookahead')
+    arg_parser.add_argument('-o', '--output', default='benchmark.json',
+                            help='file to write results to (default: benchmark.json)')
+    arg_parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = arg_parser.parse_args(argv)
+
+    if args.worker:
+        json.dump(run_config(json.load(sys.stdin)), sys.stdout)
+        return
+
+    report = {'python': platform.python_version(),
+              'platform': platform.platform(),
+              'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+              'settings': dict((key, value) for key, value in vars(args).items() \
+                               if key not in ('worker', 'output')),
+              'results': []}
+    for grammar_file in args.grammars:
+        lengths = args.lengths or DEFAULT_LENGTHS.get(grammar_file, OTHER_LENGTHS)
+        sentences = sample_sentences(grammar_file, lengths, args.per_length, args.seed)
+        for strategy in args.strategies:
+            config = {'grammar': grammar_file,
+                      'strategy': strategy,
+                      'sentences': [sentence for length in lengths for sentence in sentences[length]],
+                      'number_of_parses': args.number_of_parses,
+                      'time_limit': args.time_limit,
+                      'log_space': args.log_space,
+                      'binarize': args.binarize,
+                      'collapse_unaries': args.collapse_unaries,
+                      'left_corner_filter': args.left_corner_filter,
+                      'lookahead_filter': args.lookahead_filter}
+            result = run_in_subprocess(config)
+            result['summary'] = summarize(result)
+            report['results'].append(result)
+            print '%s %s: loaded in %.2fs, peak memory %s kB' \
+                  % (grammar_file, strategy, result['load_time'], result['peak_memory_kb'])
+            for length in lengths:
+                totals = result['summary'].get(str(length))
+                if totals is not None:
+                    print '  length %2s: %.3fs, %s iterations, %s errors' \
+                          % (length, totals['time'], totals['iterations'], totals['errors'])
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print 'Results written to %s' % args.output
+
+
+if __name__ == '__main__':
+    main()
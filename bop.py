@@ -26,7 +26,7 @@ class Bop:
         \n\n(1) a sentence\
         \n(2) the maximum number of parses you would like to see for it;\
         \n    if you want to see all possible parses, this should be -1\
-        \n(3) the parsing strategy: {fifo, bestfirst, altsearch}\
+        \n(3) the parsing strategy: {fifo, bestfirst, astar, altsearch, cky}\
         \n\nThe maximum number of parses defaults to 1.\
         \nThe parsing strategy defaults to bestfirst.\
         \nIf you are OK with the defaults, just press Enter without typing anything.\
@@ -37,9 +37,25 @@ class Bop:
 
     def print_vocabulary(self):
         print 'Vocabulary: '
-        print ', '.join(self.parser.grammar.get_lexicon())
+        print ', '.join(sorted(self.parser.grammar.get_lexicon()))
         print '\n'
 
+    def print_result(self, result):
+        '''
+        Print the parse trees of a ParseResult object along with their
+        probabilities (log-probabilities in log space)
+        '''
+        if len(result) == 0:
+            raise ParseException("No parse could be found.")
+        lines = ['%s parses found after %s iterations:' % (len(result), result.get_stats().iterations)]
+        if self.parser.beam is not None:
+            lines.append('Beam pruned %(pruned_by_threshold)s edges by threshold and %(pruned_by_top_k)s by size' \
+                         % self.parser.beam.get_stats())
+        for tree in result:
+            score = 'log %s' % tree.get_score() if result.log_space else str(tree.get_score())
+            lines.append(tree.to_indented() + '\t' + score)
+        sys.stdout.write('\n'.join(lines) + '\n')
+
     def run(self):
         while True:
             sentence = raw_input('Sentence: ')
@@ -61,7 +77,7 @@ class Bop:
                 strategy = 'bestfirst'
 
             try:
-                self.parser.parse(sentence, int(number_of_parses), strategy)
+                self.print_result(self.parser.parse(sentence, int(number_of_parses), strategy))
             except ParseException as e:
                 print '\n' + e.value + '\n'
                 self.print_vocabulary()
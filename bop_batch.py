@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+
+'''
+Parse a corpus of sentences in batch mode
+
+Sentences are read one per line from a file or from stdin and parsed
+on a pool of worker processes. Every worker loads the grammar once
+when it starts. For every sentence, one line of JSON is written in
+input order:
+
+    {"id": 0, "sentence": "...", "iterations": 107,
+     "parses": [{"tree": "[ S [ NP ... ] ]", "prob": 3.024e-07}, ...],
+     "error": null}
+
+If a sentence cannot be parsed (unknown words, no parse, or any other
+error), "parses" is empty and "error" holds the message; the other
+sentences are not affected. Scores that are not finite numbers (a
+log-probability of -inf) are written as null, so that the output is
+always valid JSON. Only a bounded number of
+sentences is handed to the workers ahead of the output, so memory use
+does not grow with the size of the corpus.
+
+Example:
+    python bop_batch.py -g english.pcfg -s astar --log-space -j 4 test.txt > parses.jsonl
+'''
+
+import argparse
+import collections
+import json
+import math
+import multiprocessing
+import sys
+from bottom_up_chart_parser import BottomUpChartParser
+from parse_exception import ParseException
+from queue_exception import QueueException
+
+parser = None   # BottomUpChartParser object of the current worker process
+
+def initialize_worker(grammar_file, log_space, cache_size=None):
+    '''
+    Create the parser of a worker process, with a result cache of
+    cache_size bytes if given
+    '''
+    global parser
+    parser = BottomUpChartParser(grammar_file, log_space, result_cache_size=cache_size)
+
+def parse_sentence(job):
+    '''
+    Parse a single sentence with the parser of the current worker
+    process and return the result as a dictionary
+
+    job is a tuple (id, sentence, number_of_parses, strategy,
+    time_limit); time_limit is the maximum number of seconds to
+    spend on the sentence, or None.
+    '''
+    sentence_id, sentence, number_of_parses, strategy, time_limit = job
+    result = {'id': sentence_id, 'sentence': sentence, 'iterations': 0,
+              'parses': [], 'error': None}
+    parser.time_limit = time_limit
+    try:
+        parses = parser.parse(sentence, number_of_parses, strategy)
+        result['iterations'] = parses.get_stats().iterations
+        if len(parses) == 0:
+            result['error'] = 'No parse could be found.'
+        for tree in sorted(parses, key=lambda tree: tree.get_score(), reverse=True):
+            result['parses'].append({'tree': tree.to_brackets(),
+                                     'prob': get_json_score(tree.get_score())})
+    except (ParseException, QueueException) as e:
+        result['parses'] = []
+        result['error'] = e.value
+    except Exception as e:
+        # Any other failure only affects this sentence
+        result['parses'] = []
+        result['error'] = '%s: %s' % (e.__class__.__name__, e)
+    return result
+
+def get_json_score(score):
+    '''
+    Return a score as it is written to the output: None unless it is
+    a finite number, since JSON has no infinity
+    '''
+    if math.isinf(score) or math.isnan(score):
+        return None
+    return score
+
+def read_jobs(lines, number_of_parses, strategy, time_limit=None):
+    '''
+    Generate a job for every non-empty line of input
+    '''
+    sentence_id = 0
+    for line in lines:
+        sentence = line.strip()
+        if sentence:
+            yield (sentence_id, sentence, number_of_parses, strategy, time_limit)
+            sentence_id += 1
+
+def write_result(result, output):
+    output.write(json.dumps(result, sort_keys=True, allow_nan=False) + '\n')
+    output.flush()
+
+def run(jobs, output, grammar_file, log_space=False, workers=1, window=None):
+    '''
+    Parse all jobs and write their results to output in input order
+
+    With more than one worker, at most window jobs (by default four
+    per worker) are pending at any time; reading further input waits
+    until the oldest pending result has been written.
+    '''
+    if workers <= 1:
+        initialize_worker(grammar_file, log_space)
+        for job in jobs:
+            write_result(parse_sentence(job), output)
+        return
+
+    if window is None:
+        window = 4*workers
+    pool = multiprocessing.Pool(workers, initialize_worker, (grammar_file, log_space))
+    try:
+        pending = collections.deque()
+        for job in jobs:
+            if len(pending) >= window:
+                write_result(pending.popleft().get(), output)
+            pending.append(pool.apply_async(parse_sentence, (job,)))
+        while pending:
+            write_result(pending.popleft().get(), output)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description='Parse a corpus with one sentence per line.')
+    arg_parser.add_argument('input', nargs='?', default='-',
+                            help='file with one sentence per line (default: stdin)')
+    arg_parser.add_argument('-o', '--output', default='-',
+                            help='file to write JSON lines to (default: stdout)')
+    arg_parser.add_argument('-g', '--grammar', default='sample.pcfg',
+                            help='grammar file (default: sample.pcfg)')
+    arg_parser.add_argument('-n', '--number-of-parses', type=int, default=1,
+                            help='maximum number of parses per sentence; -1 for all (default: 1)')
+    arg_parser.add_argument('-s', '--strategy', default='bestfirst',
+                            help='parsing strategy: {fifo, bestfirst, astar, altsearch, cky} (default: bestfirst)')
+    arg_parser.add_argument('-j', '--workers', type=int, default=multiprocessing.cpu_count(),
+                            help='number of worker processes (default: number of CPUs)')
+    arg_parser.add_argument('-w', '--window', type=int, default=None,
+                            help='maximum number of sentences parsed ahead of the output (default: 4 per worker)')
+    arg_parser.add_argument('-t', '--time-limit', type=float, default=None,
+                            help='maximum number of seconds per sentence (default: none)')
+    arg_parser.add_argument('--log-space', action='store_true',
+                            help='score edges with log-probabilities')
+    args = arg_parser.parse_args(argv)
+
+    input = sys.stdin if args.input == '-' else open(args.input)
+    output = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        run(read_jobs(input, args.number_of_parses, args.strategy, args.time_limit), output,
+            args.grammar, args.log_space, args.workers, args.window)
+    finally:
+        if input is not sys.stdin:
+            input.close()
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+
+'''
+Keep parsers with a loaded grammar resident and serve parse requests
+
+The server accepts requests either over HTTP on localhost or over a
+Unix socket. Each request is a JSON object
+
+    {"sentence": "small mice ate", "strategy": "bestfirst",
+     "number_of_parses": 1, "timeout": 10}
+
+of which only "sentence" is required; "strategy" is one of fifo,
+bestfirst, astar, altsearch and cky, "number_of_parses" is a positive
+integer or -1 for all parses, and "timeout" is a positive number of
+seconds. The response is a JSON object in the format written by
+bop_batch.py; invalid requests are answered with an error. Over HTTP,
+requests are POSTed to /parse (GET /health reports whether the server
+is up); over a Unix socket, every line sent is a request and is
+answered with one line.
+
+Connections are handled by one thread each, while sentences are
+parsed on a pool of worker processes that load the grammar once when
+the server starts. A request that takes longer than its timeout is
+answered with an error; the worker stops parsing it as well (see
+BottomUpChartParser.time_limit).
+
+Example:
+    python bop_server.py -g english.pcfg --log-space --port 8000
+    curl -d '{"sentence": "the company expects growth ."}' localhost:8000/parse
+'''
+
+import argparse
+import BaseHTTPServer
+import itertools
+import json
+import multiprocessing
+import os
+import SocketServer
+import threading
+import bop_batch
+
+DEFAULT_TIMEOUT = 30    # Seconds a request may take if it does not set a timeout
+STRATEGIES = ['fifo', 'bestfirst', 'astar', 'altsearch', 'cky']
+
+class ParseService:
+    '''
+    This class hands parse requests to a pool of worker processes
+    and waits for their results
+    '''
+
+    pool = None     # multiprocessing.Pool of workers with a parser each
+    counter = None  # Source of ids for requests
+    lock = None     # Lock guarding counter, which is shared by threads
+
+    def __init__(self, grammar_file, log_space=False, workers=1, cache_size=None):
+        self.pool = multiprocessing.Pool(workers, bop_batch.initialize_worker,
+                                         (grammar_file, log_space, cache_size))
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+
+    def check_request(self, request):
+        '''
+        Return an error message if a request (a dictionary, see above)
+        is invalid, or None if it is valid
+        '''
+        if not isinstance(request.get('sentence'), basestring):
+            return 'Request does not contain a sentence.'
+        strategy = request.get('strategy', 'bestfirst')
+        if strategy not in STRATEGIES:
+            return 'Invalid strategy. Please choose a strategy from the following set: {%s}' \
+                   % ', '.join(STRATEGIES)
+        number_of_parses = request.get('number_of_parses', 1)
+        if not isinstance(number_of_parses, (int, long)) or isinstance(number_of_parses, bool) \
+                or (number_of_parses < 1 and number_of_parses != -1):
+            return 'Invalid number_of_parses. Please choose a positive integer or -1.'
+        timeout = request.get('timeout')
+        if timeout is not None and (not isinstance(timeout, (int, long, float)) \
+                                    or isinstance(timeout, bool) or not 0 < timeout < float('inf')):
+            return 'Invalid timeout. Please choose a positive number of seconds.'
+        return None
+
+    def parse(self, request):
+        '''
+        Parse the sentence of a request (a dictionary, see above) and
+        return the result as a dictionary
+        '''
+        with self.lock:
+            request_id = next(self.counter)
+        sentence = request.get('sentence')
+        error = self.check_request(request)
+        if error is not None:
+            return {'id': request_id, 'sentence': sentence, 'iterations': 0,
+                    'parses': [], 'error': error}
+        timeout = request.get('timeout') or DEFAULT_TIMEOUT
+        job = (request_id, sentence.encode('utf-8') if isinstance(sentence, unicode) else sentence,
+               request.get('number_of_parses', 1), str(request.get('strategy', 'bestfirst')), timeout)
+        result = self.pool.apply_async(bop_batch.parse_sentence, (job,))
+        try:
+            # Leave the worker some time to notice the time limit
+            # itself, so that it can report how far it got
+            return result.get(timeout + 1)
+        except multiprocessing.TimeoutError:
+            return {'id': request_id, 'sentence': sentence, 'iterations': 0,
+                    'parses': [], 'error': 'Time limit of %s seconds exceeded.' % timeout}
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+
+class HTTPRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path == '/health':
+            self.send_json(200, {'status': 'ok'})
+        else:
+            self.send_json(404, {'error': 'Not found.'})
+
+    def do_POST(self):
+        if self.path != '/parse':
+            self.send_json(404, {'error': 'Not found.'})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.getheader('content-length', 0))))
+        except ValueError:
+            self.send_json(400, {'error': 'Request is not valid JSON.'})
+            return
+        if not isinstance(request, dict):
+            self.send_json(400, {'error': 'Request is not a JSON object.'})
+            return
+        self.send_json(200, self.server.service.parse(request))
+
+    def send_json(self, status, response):
+        body = json.dumps(response, sort_keys=True)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+class UnixRequestHandler(SocketServer.StreamRequestHandler):
+
+    def handle(self):
+        for line in iter(self.rfile.readline, ''):
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError:
+                request = None
+            if isinstance(request, dict):
+                response = self.server.service.parse(request)
+            else:
+                response = {'error': 'Request is not a JSON object.'}
+            self.wfile.write(json.dumps(response, sort_keys=True) + '\n')
+            self.wfile.flush()
+
+
+class HTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    service = None  # ParseService object shared by all requests
+    verbose = False # If True, every request is logged to stderr
+
+
+class UnixServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    daemon_threads = True
+    service = None  # ParseService object shared by all requests
+
+
+def create_server(service, port=None, socket_path=None, verbose=False):
+    '''
+    Create a server that answers requests with a ParseService, either
+    over HTTP on the given localhost port or over a Unix socket at the
+    given path
+    '''
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = UnixServer(socket_path, UnixRequestHandler)
+    else:
+        server = HTTPServer(('127.0.0.1', port), HTTPRequestHandler)
+        server.verbose = verbose
+    server.service = service
+    return server
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description='Serve parse requests with a resident grammar.')
+    arg_parser.add_argument('-g', '--grammar', default='sample.pcfg',
+                            help='grammar file (default: sample.pcfg)')
+    arg_parser.add_argument('-j', '--workers', type=int, default=multiprocessing.cpu_count(),
+                            help='number of worker processes (default: number of CPUs)')
+    arg_parser.add_argument('-p', '--port', type=int, default=8000,
+                            help='localhost port to serve HTTP on (default: 8000)')
+    arg_parser.add_argument('-u', '--socket', default=None,
+                            help='serve on a Unix socket at this path instead of HTTP')
+    arg_parser.add_argument('-v', '--verbose', action='store_true',
+                            help='log every HTTP request')
+    arg_parser.add_argument('--log-space', action='store_true',
+                            help='score edges with log-probabilities')
+    arg_parser.add_argument('-c', '--cache-size', type=int, default=None,
+                            help='megabytes of parse results to cache per worker (default: no cache)')
+    args = arg_parser.parse_args(argv)
+
+    cache_size = args.cache_size * 2**20 if args.cache_size is not None else None
+    service = ParseService(args.grammar, args.log_space, args.workers, cache_size)
+    server = create_server(service, args.port, args.socket, args.verbose)
+    print 'Serving %s on %s' % (args.grammar, args.socket or 'http://127.0.0.1:%s' % args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if args.socket is not None and os.path.exists(args.socket):
+            os.remove(args.socket)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,22 @@
 #!/usr/bin/env python
 
+from beam import Beam
+from cache import LRUCache, estimate_edges_size
 from chart import Chart
-from queue import Queue, BestFirstQueue, AltSearchQueue
+from cky_parser import CKYParser
+from queue import Queue, BestFirstQueue, AStarQueue, AltSearchQueue
 from edge import Edge
+from kbest import KBestExtractor
+from parse_result import ParseResult
+from parse_session import ParseSession
+from parse_stats import ParseStats
 from production_rule import ProductionRule
-from grammar import Grammar
+from grammar import Grammar, GOAL_SYMBOL
 from parse_exception import ParseException
 from queue_exception import QueueException
 from bisect import bisect
+import math
+import time
 
 class BottomUpChartParser:
 
@@ -17,61 +26,293 @@ class BottomUpChartParser:
     chart = None    # Chart object in which edges are stored for the
                     # final parse generation
     sentence_length = 0
-    will_print_chart = True # Set to false if you want to deactivate printing of the found parses
-
-    def __init__(self, grammar):
+    stats = None    # ParseStats object of the last call to parse
+    hooks = None    # Dictionary: event (key), list of functions to be
+                    # called with the edge concerned (value); see
+                    # add_hook
+    time_limit = None   # Maximum number of seconds a parse may take
+                        # per sentence, or None
+    log_space = False   # If True, edges are scored with log-probabilities,
+                        # which do not underflow on long sentences
+    binarize = False    # If True, the grammar has been binarized
+    collapse_unaries = False    # If True, chains of unary rules are
+                                # applied in a single step (see
+                                # unary_rule)
+    cky_parser = None   # CKYParser object used for the cky strategy
+    beam = None         # Beam object used to prune edges, or None
+    packed = False      # If True, edges that only differ in their
+                        # daughters are packed into a single edge
+                        # (see Edge.get_alternatives)
+    items = None        # Dictionary: item signature (key), edge
+                        # standing for all edges with that signature
+                        # (value); only used if packed is True
+    left_corner_filter = False  # If True, only rules that can lead to
+                                # a symbol needed at a node are predicted
+                                # there (see predict_rule)
+    expected = None     # List: node (index), bitset of the left corners
+                        # of all symbols needed at that node (value)
+    deferred = None     # List: node (index), dictionary of predictions
+                        # rejected at that node so far: bitset of LHS
+                        # (key), set of production rules, or of
+                        # complete edges made by unary_rule (value)
+    lookahead_filter = False    # If True, edges are only created if
+                                # the symbol they need next can start
+                                # with the token at their end node
+                                # (see fundamental_rule)
+    lookahead = None    # List: node (index), bitset of the preterminals
+                        # of the token starting at that node, or -1
+                        # (all bits set) if it is not known yet (value)
+    result_cache = None # LRUCache of the parses found by parse (see
+                        # get_result_key), or None
+    span_cache = None   # LRUCache of the CKY chart cells of token
+                        # sequences (see CKYParser.parse), or None
+
+    def __init__(self, grammar, log_space=False, binarize=False, collapse_unaries=False,
+                 left_corner_filter=False, lookahead_filter=False,
+                 result_cache_size=None, span_cache_size=None):
+        '''
+        If binarize is True, the parser works with a binarized version
+        of the grammar (see Grammar.binarize). This reduces the number
+        of incomplete edges considerably. If collapse_unaries is True,
+        unary rules are not predicted; instead, every complete edge
+        directly produces complete edges for all symbols it can be
+        rewritten from by a chain of unary rules, using the most
+        probable chain (see unary_rule). This saves taking a self-loop
+        edge and a complete edge through the queue for every link of
+        the chain, while the rules of the grammar stay as they are. In
+        both cases, parse trees are displayed with the labels of the
+        original grammar.
+
+        If left_corner_filter is True, predictions that cannot
+        contribute to a parse are not made (see predict_rule). If
+        lookahead_filter is True, edges that cannot be continued with
+        the next token are not made either (see fundamental_rule).
+
+        result_cache_size and span_cache_size enable caching across
+        sentences, with the given maximum number of bytes per cache:
+        the result cache returns the parses of a sentence parsed
+        before with the same settings without parsing it again, and
+        the span cache lets the cky strategy reuse the chart cells of
+        token sequences seen before. Least recently used entries are
+        evicted first; hits and misses are counted by the caches (see
+        LRUCache.get_stats).
+        '''
         self.grammar = Grammar(grammar)
-
-    def parse(self, sentence, number_of_parses, strategy):
+        self.binarize = binarize
+        self.collapse_unaries = collapse_unaries
+        if binarize:
+            self.grammar = self.grammar.binarize()
+        self.log_space = log_space
+        self.left_corner_filter = left_corner_filter
+        self.lookahead_filter = lookahead_filter
+        self.hooks = {}
+        if result_cache_size is not None:
+            self.result_cache = LRUCache(result_cache_size)
+        if span_cache_size is not None:
+            self.span_cache = LRUCache(span_cache_size)
+
+    def parse(self, sentence, number_of_parses=1, strategy='bestfirst',
+              beam_threshold=None, beam_size=None, packed=False):
         '''
         Parse the input sentence
 
         This is the central method to be called from outside.
+
+        Passing beam_threshold and/or beam_size enables beam pruning
+        (see Beam): complete edges less probable than beam_threshold
+        times the best edge with the same span and LHS, or not among
+        the beam_size best edges with the same span and LHS, are dropped
+        before they are queued. This bounds the work per sentence at
+        the risk of missing the best parse. Beam pruning does not
+        apply to the cky strategy.
+
+        The cky strategy only finds the most probable parse, so it
+        raises QueueException if number_of_parses is not 1.
+
+        If packed is True, the chart is a packed parse forest: all
+        edges with the same span, rule and dot are represented by a
+        single edge holding the alternative daughters of all of them
+        (see add_to_queue), so the chart only grows with the number of
+        distinct items rather than the number of derivations. The
+        parser then runs to completion, and the number_of_parses most
+        probable parses are unpacked from the forest afterwards (see
+        KBestExtractor), best first. Packing works with the fifo,
+        bestfirst and astar strategies.
+
+        If the result cache is enabled and the sentence has been parsed
+        before with the same arguments, the parses found then are put
+        into an empty chart, and the queue is not run at all. The span
+        cache is only used by the cky strategy; the other strategies
+        always build the chart from scratch.
+
+        Returns a ParseResult object holding the parses and
+        statistics on the parse; the statistics are also kept in the
+        attribute stats.
         '''
-        ### Preprocessing ###
-        # Tokenize input sentence
-        tokens = self.tokenize(sentence)
-        self.sentence_length = len(tokens)
+        if packed and strategy not in ('fifo', 'bestfirst', 'astar'):
+            raise QueueException('Invalid strategy (%s) for packed parsing. Please try again and choose a strategy from the following set: {fifo, bestfirst, astar}' % strategy)
+        if strategy == 'cky' and number_of_parses != 1:
+            raise QueueException('The cky strategy only finds the most probable parse. Please try again with number_of_parses = 1 or choose another strategy.')
+        self.stats = ParseStats(strategy)
+        deadline = self.get_deadline()
 
-        # Check for unknown tokens
-        unknown_words = self.get_unknown_words(tokens)
-        if unknown_words:
-            # TODO: Run fallback solutions to fix unknown words, else
-            # raise exception
-            raise ParseException("Sentence contains unknown words (%s). Please try again!" % ', '.join(unknown_words))
+        ### Preprocessing ###
+        self.stats.start_phase('preprocess')
+        tokens = self.preprocess(sentence)
+        if self.hooks:
+            self.run_hooks('start', tokens)
 
         ### Main steps ###
-        # (1) Initialize empty chart and queue
+        # (1) Initialize empty chart and beam
+        self.stats.start_phase('initialize')
         self.initialize_chart()
-        self.initialize_queue(strategy)
+        self.initialize_filters(tokens)
+        self.initialize_beam(beam_threshold, beam_size)
+        key = self.get_result_key(tokens, strategy, number_of_parses, beam_threshold, beam_size, packed)
+        cached = self.result_cache.get(key) if key is not None else None
+
+        if cached is not None:
+            # (2) Reuse the parses found for the same sentence before
+            for s_edge in cached:
+                self.chart.add_edge(s_edge)
+            self.stats.cached = True
+            iters = 0
+        elif strategy == 'cky':
+            # (2) Fill the chart with the best parse in a single
+            #     bottom-up pass
+            self.stats.start_phase('agenda')
+            iters = self.run_cky(tokens, deadline)
+        else:
+            # (2) Initialize empty queue
+            self.initialize_queue(strategy)
+
+            self.packed = packed
+            self.items = {} if packed else None
+            try:
+                # (3) For every token, create a complete edge and push
+                #     it to the queue
+                self.init_rule(tokens)
+
+                # (4) Process the queue; a packed chart has to be
+                #     complete before parses can be extracted from it
+                self.stats.start_phase('agenda')
+                iters = self.run_agenda(-1 if packed else number_of_parses, strategy, deadline)
+            finally:
+                self.packed = False
+                self.items = None
+
+        # (5) Collect generated parses
+        if packed and cached is None:
+            s_edges = self.unpack_parses(number_of_parses, deadline)
+        else:
+            s_edges = self.chart.get_s_edges()
+        if key is not None and cached is None:
+            self.result_cache.put(key, list(s_edges), estimate_edges_size(s_edges))
+        self.finish_stats(iters, s_edges)
+        # Parses of the cky strategy are built with the grammar of the
+        # CKY parser, which knows the intermediate symbols in them
+        grammar = self.get_cky_parser().grammar if strategy == 'cky' else self.grammar
+        return ParseResult(tokens, s_edges, self.stats, grammar, self.log_space)
+
+    def parse_k_best(self, sentence, k, strategy='bestfirst'):
+        '''
+        Parse the input sentence with a packed chart and return its k
+        most probable parses, best first; k = -1 returns all of them
+
+        This is short for parse with packed set to True.
+        '''
+        return self.parse(sentence, k, strategy, packed=True)
+
+    def start_session(self, strategy='bestfirst'):
+        '''
+        Start parsing a sentence whose tokens arrive one at a time
+
+        Returns a ParseSession object; see there. The parser can only
+        run one session at a time, and parse must not be called
+        before the session is finished.
+        '''
+        return ParseSession(self, strategy)
+
+    def extract_k_best(self, tokens, k, iters):
+        '''
+        Extract the k best parses of a list of tokens from a packed
+        chart filled after a number of iterations and return them as
+        a ParseResult object
+        '''
+        s_edges = self.unpack_parses(k, self.get_deadline())
+        self.finish_stats(iters, s_edges)
+        return ParseResult(tokens, s_edges, self.stats, self.grammar, self.log_space)
+
+    def unpack_parses(self, k, deadline=None):
+        '''
+        Extract the k best parses from a packed chart as a list of
+        complete S edges without alternatives, best first
+
+        Raises ParseException if the deadline (see get_deadline)
+        passes before they are all extracted.
+        '''
+        self.stats.start_phase('extract')
+        check_time = (lambda: self.check_deadline(deadline)) if deadline is not None else None
+        extractor = KBestExtractor(self.get_rule_score, self.combine_scores, check_time)
+        return extractor.get_k_best(self.chart.get_s_edges(), k)
+
+    def get_deadline(self):
+        '''
+        Return the time by which a parse starting now must be
+        finished, or None if time_limit is not set
+        '''
+        if self.time_limit is None:
+            return None
+        return time.time() + self.time_limit
 
-        # (2) For every token, create a complete edge and push it to
-        #     the queue
-        self.init_rule(tokens)
+    def check_deadline(self, deadline):
+        '''
+        Raise ParseException if a deadline (see get_deadline) has
+        passed
+        '''
+        if deadline is not None and time.time() > deadline:
+            raise ParseException("Time limit of %s seconds exceeded." % self.time_limit)
+
+    def run_agenda(self, number_of_parses, strategy, deadline=None):
+        '''
+        Transfer edges from the queue to the chart and apply the rules
+        of the parser to them until no more edges are added or a
+        sufficient number of parses has been found
 
+        Returns the number of iterations. Raises ParseException if
+        the deadline (see get_deadline) passes first.
+        '''
         # Iteration counter for evaluation purposes
         iters = 0
 
-        # (3) Repeat until no more edges are added
-        #     or sufficient number of parses has been found:
+        # Repeat until no more edges are added
+        # or sufficient number of parses has been found:
         while not self.queue.is_empty() and not self.enough_parses_found(number_of_parses):
             iters = iters + 1
-            # (3.1) Add next element on queue to the chart
+            if deadline is not None and iters % 256 == 0:
+                self.check_deadline(deadline)
+            # (1) Add next element on queue to the chart
             edge = self.queue.get_next_edge()
+            if self.hooks:
+                self.run_hooks('pop', edge)
             self.chart.add_edge(edge)
+            if self.hooks:
+                self.run_hooks('chart', edge)
 
-            # (3.2) If input edge is complete,
-            #       apply predict rule and fundamental rule.
-            #       If input edge is incomplete,
-            #       apply fundamental rule only
+            # (2) If input edge is complete,
+            #     apply predict rule and fundamental rule.
+            #     If input edge is incomplete,
+            #     apply fundamental rule only
             if edge.is_complete():
+                if self.collapse_unaries:
+                    self.unary_rule(edge)
                 self.predict_rule(edge)
 
             self.fundamental_rule(edge)
 
-            # (3.3) For alt search strategy, run search rule
-            #       if input edge is a complete parse
-            #       or last element of priority queue
+            # (3) For alt search strategy, run search rule
+            #     if input edge is a complete parse
+            #     or last element of priority queue
             if strategy == 'altsearch':
                 if ( ( (not self.queue.is_priority_active()) # Case 1: Complete parse was added to chart
                   and edge.get_prod_rule().get_lhs() == 'S'
@@ -81,15 +322,130 @@ class BottomUpChartParser:
                   or (self.queue.is_priority_active()        # Case 2: Priority queue emptied
                       and self.queue.is_priority_empty() ) ):
                         self.search_rule(edge)
+        return iters
 
-        # 4) Display generated parses
-        s_edges = self.chart.get_s_edges()
-        print '%s parses found after %s iterations:' % (len(s_edges),iters)
-        if self.will_print_chart :
-            self.display_parses()
-        else:
-            for s_edge in s_edges:
-                print 'Found s-edge: %s' % s_edge
+    def get_cky_parser(self):
+        '''
+        Return the CKY parser used for the cky strategy, creating it
+        on first use
+
+        The CKY parser requires a grammar without rules that have more
+        than two RHS elements, so it is given a binarized version of
+        the grammar if necessary.
+        '''
+        if self.cky_parser is None:
+            grammar = self.grammar if self.grammar.is_binary() else self.grammar.binarize()
+            self.cky_parser = CKYParser(grammar)
+        return self.cky_parser
+
+    def run_cky(self, tokens, deadline=None):
+        '''
+        Find the best parse with the vectorized CKY parser (see
+        get_cky_parser) and add it to the chart
+
+        Returns the number of chart cells the CKY parser computed;
+        cells taken from the span cache are counted separately.
+        Raises ParseException if the deadline (see get_deadline)
+        passes first.
+        '''
+        cky_parser = self.get_cky_parser()
+        if self.span_cache is not None:
+            hits = self.span_cache.hits
+        check_time = (lambda: self.check_deadline(deadline)) if deadline is not None else None
+        s_edge, cells = cky_parser.parse(tokens, 'S', self.log_space, self.span_cache, check_time)
+        if self.span_cache is not None:
+            self.stats.spans_cached = self.span_cache.hits - hits
+        if s_edge is not None:
+            self.chart.add_edge(s_edge)
+            if self.hooks:
+                self.run_hooks('chart', s_edge)
+        return cells
+
+    def finish_stats(self, iterations, s_edges):
+        '''
+        Stop timing the last phase of parsing and record the final
+        statistics of the parse
+        '''
+        self.stats.stop_phase()
+        self.stats.iterations = iterations
+        self.stats.sentence_length = self.sentence_length
+        self.stats.parses = len(s_edges)
+        self.stats.record_chart(self.chart)
+        if self.beam is not None:
+            self.stats.beam_pruned = sum(self.beam.get_stats().values())
+        if self.hooks:
+            self.run_hooks('finish', self.stats)
+
+    def get_result_key(self, tokens, strategy, number_of_parses, beam_threshold, beam_size, packed):
+        '''
+        Return the key of the parses of a sentence in the result
+        cache, or None if the result cache is not enabled
+
+        The key includes every argument and setting of the parser that
+        the parses depend on, so that changing a setting between two
+        calls never returns parses found with the old one. The cached
+        edges refer to the grammar of this parser, so the cache must
+        not be shared with another parser.
+        '''
+        if self.result_cache is None:
+            return None
+        return (tuple(tokens), strategy, number_of_parses, beam_threshold, beam_size, packed,
+                self.log_space, self.binarize, self.collapse_unaries,
+                self.left_corner_filter, self.lookahead_filter, self.grammar.get_source_hash())
+
+    def add_hook(self, event, callback):
+        '''
+        Register a function to be called whenever one of the
+        following events occurs:
+
+        'start'   a parse starts; called with the list of tokens
+        'create'  an edge was created and is offered to the queue
+        'push'    an edge was pushed to the queue
+        'pop'     an edge was taken from the queue
+        'chart'   an edge was added to the chart
+        'finish'  a parse is finished; called with its ParseStats
+
+        The edge events are called with the edge concerned. As long as
+        no function is registered, hooks cost nothing but a check
+        whether there are any.
+        '''
+        if event not in ('start', 'create', 'push', 'pop', 'chart', 'finish'):
+            raise ValueError('Unknown hook event (%s)' % event)
+        self.hooks.setdefault(event, []).append(callback)
+
+    def remove_hook(self, event, callback):
+        '''
+        Unregister a function registered with add_hook
+        '''
+        self.hooks[event].remove(callback)
+        if not self.hooks[event]:
+            del self.hooks[event]
+
+    def run_hooks(self, event, arg):
+        '''
+        Call all functions registered for an event with an edge (or
+        the argument of the event, see add_hook)
+        '''
+        for callback in self.hooks.get(event, ()):
+            callback(arg)
+
+    def preprocess(self, sentence):
+        '''
+        Tokenize a sentence and check it for unknown words
+
+        Returns the list of tokens.
+        '''
+        # Tokenize input sentence
+        tokens = self.tokenize(sentence)
+        self.sentence_length = len(tokens)
+
+        # Check for unknown tokens
+        unknown_words = self.get_unknown_words(tokens)
+        if unknown_words:
+            # TODO: Run fallback solutions to fix unknown words, else
+            # raise exception
+            raise ParseException("Sentence contains unknown words (%s). Please try again!" % ', '.join(unknown_words))
+        return tokens
 
     def tokenize(self, sentence):
         '''
@@ -115,6 +471,48 @@ class BottomUpChartParser:
         '''
         self.chart = Chart(self.sentence_length)
 
+    def initialize_filters(self, tokens):
+        '''
+        Initialize the left-corner and lookahead filters if they are
+        used
+
+        For the left-corner filter, the goal symbol is needed at the
+        start of the sentence; nothing is needed anywhere else until
+        incomplete edges are added. For the lookahead filter, the
+        preterminals of every token are looked up; nothing can start
+        at the end of the sentence.
+        '''
+        if self.lookahead_filter:
+            self.lookahead = [self.grammar.get_preterminal_set(token) for token in tokens] + [0]
+        if self.left_corner_filter:
+            self.expected = [0]*(self.sentence_length+1)
+            self.deferred = [{} for _ in xrange(self.sentence_length+1)]
+            self.expected[0] = self.grammar.get_left_corners(GOAL_SYMBOL)
+
+    def extend_filters(self, token):
+        '''
+        Extend the filters by the node after a token appended to the
+        sentence
+
+        For the lookahead filter, the next token is not known yet, so
+        anything is allowed to start at the new node until it is.
+        '''
+        if self.lookahead_filter:
+            self.lookahead[-1] = self.grammar.get_preterminal_set(token)
+            self.lookahead.append(-1)
+        if self.left_corner_filter:
+            self.expected.append(0)
+            self.deferred.append({})
+
+    def initialize_beam(self, threshold, size):
+        '''
+        Initialize beam if a threshold or a size is given
+        '''
+        if threshold is None and size is None:
+            self.beam = None
+        else:
+            self.beam = Beam(threshold, size, self.log_space)
+
     def initialize_queue(self, strategy):
         '''
         Initialize queue according to the parsing strategy chosen by
@@ -124,26 +522,46 @@ class BottomUpChartParser:
             self.queue = Queue()
         elif strategy == 'bestfirst':
             self.queue = BestFirstQueue()
+        elif strategy == 'astar':
+            self.queue = AStarQueue(self.get_astar_priority)
         elif strategy == 'altsearch':
             self.queue = AltSearchQueue(self.sentence_length+1)
         else:
-            raise QueueException('Invalid strategy (%s). Please try again and choose a strategy from the following set: {fifo, bestfirst, altsearch}' % strategy)
+            raise QueueException('Invalid strategy (%s). Please try again and choose a strategy from the following set: {fifo, bestfirst, astar, altsearch, cky}' % strategy)
 
     def init_rule(self, tokens):
         '''
         Generate initial edges for all given tokens and add them to
         the queue
 
+        For every token, the POS tags it can have are looked up in
+        the lexical rules of the grammar, and a complete edge is
+        created directly for each of them. This saves predicting a
+        self-loop edge for every lexical rule and advancing it over
+        the token via the fundamental rule.
+
         Formal definition:
-            For every word w_i add the edge [w_i -> . , (i, i+1)]
+            For every word w_i and every lexical rule A -> w_i
+            add the edge [A -> w_i . , (i, i+1)]
         '''
         node = -1   # Position between tokens of sentence
                     # (0 is start of sentence)
         for token in tokens:
             node += 1
-            rule = ProductionRule(token, [], 1.0)
-            edge = Edge(node, node+1, rule, 0, [])
-            self.queue.add_edge(edge)
+            self.init_token(node, token)
+
+    def init_token(self, node, token):
+        '''
+        Generate the initial edges for the token starting at node and
+        add them to the queue (see init_rule)
+        '''
+        rule = ProductionRule(token, [], 1.0)
+        word_edge = Edge(node, node+1, rule, 0, prob=self.get_rule_score(rule))
+        for lexical_rule in self.grammar.get_lexical_rules(token):
+            prob = self.combine_scores(self.get_rule_score(lexical_rule),
+                                       word_edge.get_prob())
+            edge = Edge(node, node+1, lexical_rule, 1, None, word_edge, prob)
+            self.add_to_queue(edge)
 
     def enough_parses_found(self, number_of_parses):
         '''
@@ -168,15 +586,125 @@ class BottomUpChartParser:
             For each complete edge [A -> alpha . , (i, j)]
             and each production rule  B -> A beta,
             add the self-loop edge [B -> . A beta , (i, i)]
+
+        With the lookahead filter, rules B -> A C gamma are skipped if
+        C cannot start with the token at j, since the edge could not
+        be advanced beyond A anyway.
+
+        With the left-corner filter, B must also be a left corner of
+        some symbol C needed at i, i.e. the goal symbol if i = 0 or
+        the symbol after the dot of an incomplete edge ending at i;
+        otherwise the edge can never become part of a parse. Rules
+        that fail this test are kept and predicted later if an
+        incomplete edge ending at i comes along that needs them
+        (see expect).
         '''
         start = complete_edge.get_start()
         lhs = complete_edge.get_prod_rule().get_lhs()
-        parent_rules = self.grammar.get_possible_parent_rules(lhs)
+        if self.collapse_unaries:
+            # Unary rules are applied by unary_rule instead
+            parent_rules = self.grammar.get_branching_parent_rules(lhs)
+        else:
+            parent_rules = self.grammar.get_possible_parent_rules(lhs)
+        if self.lookahead_filter:
+            end = complete_edge.get_end()
+            parent_rules = [parent_rule for parent_rule in parent_rules \
+                            if parent_rule.get_rhs_length() == 1 \
+                            or self.can_start_at(parent_rule.get_rhs_element(1), end)]
+        if self.left_corner_filter:
+            parent_rules = self.filter_predictions(start, parent_rules)
+        self.stats.predictions += len(parent_rules)
 
         for parent_rule in parent_rules:
-            new_edge = Edge(start, start, parent_rule, 0, [])
-            if not self.queue.has_edge(new_edge) and not self.chart.has_edge(new_edge):
-                self.queue.add_edge(new_edge)
+            new_edge = Edge(start, start, parent_rule, 0,
+                            prob=self.get_rule_score(parent_rule))
+            self.add_to_queue(new_edge)
+
+    def unary_rule(self, complete_edge):
+        '''
+        Apply whole chains of unary rules to a complete edge at once
+        and push the resulting complete edges to the queue
+
+        Input: Complete edge
+        Push to queue: Complete edges
+
+        Formal definition:
+            For each complete edge [B -> alpha . , (i, j)]
+            and each non-terminal A such that A =>+ B by unary rules,
+            add the edge [A -> B . , (i, j)]
+
+        The new edges are scored with the most probable chain from A
+        to B, and the labels of the non-terminals in between are
+        recorded on their production rules (see
+        Grammar.compute_unary_chains). Edges made by this rule are not
+        extended by it again: the chains from B already include every
+        longer chain.
+
+        With the left-corner filter, edges whose LHS is not a left
+        corner of a symbol needed at i are not pushed (see
+        filter_predictions); they are kept and pushed later if such a
+        symbol comes along (see expect).
+        '''
+        prod_rule = complete_edge.get_prod_rule()
+        if self.grammar.is_unary_chain_rule(prod_rule):
+            return
+        start = complete_edge.get_start()
+        end = complete_edge.get_end()
+        for chain_rule in self.grammar.get_unary_chains(prod_rule.get_lhs()):
+            prob = self.combine_scores(self.get_rule_score(chain_rule),
+                                       complete_edge.get_prob())
+            new_edge = Edge(start, end, chain_rule, 1, None, complete_edge, prob)
+            if self.left_corner_filter:
+                bit = self.grammar.get_symbol_bit(chain_rule.get_lhs())
+                if not self.expected[start] & bit:
+                    self.deferred[start].setdefault(bit, set()).add(new_edge)
+                    continue
+            self.add_to_queue(new_edge)
+
+    def filter_predictions(self, node, prod_rules):
+        '''
+        Return the production rules whose LHS is a left corner of a
+        symbol needed at node, and defer the others
+        '''
+        expected = self.expected[node]
+        deferred = self.deferred[node]
+        filtered = []
+        for prod_rule in prod_rules:
+            bit = self.grammar.get_symbol_bit(prod_rule.get_lhs())
+            if expected & bit:
+                filtered.append(prod_rule)
+            else:
+                deferred.setdefault(bit, set()).add(prod_rule)
+        return filtered
+
+    def can_start_at(self, symbol, node):
+        '''
+        Check whether symbol can start with the token at node
+        '''
+        return self.grammar.get_first_set(symbol) & self.lookahead[node] != 0
+
+    def expect(self, node, symbol):
+        '''
+        Record that symbol is needed at node and predict the deferred
+        rules that this makes useful
+        '''
+        left_corners = self.grammar.get_left_corners(symbol)
+        new = left_corners & ~self.expected[node]
+        if not new:
+            return
+        self.expected[node] |= left_corners
+        deferred = self.deferred[node]
+        for bit, prod_rules in deferred.items():
+            if bit & new:
+                del deferred[bit]
+                for prod_rule in prod_rules:
+                    if isinstance(prod_rule, Edge):
+                        # Complete edge deferred by unary_rule
+                        self.add_to_queue(prod_rule)
+                        continue
+                    self.stats.predictions += 1
+                    self.add_to_queue(Edge(node, node, prod_rule, 0,
+                                           prob=self.get_rule_score(prod_rule)))
 
     def fundamental_rule(self, input_edge):
         '''
@@ -209,47 +737,190 @@ class BottomUpChartParser:
             If the chart contains the edges [A -> alpha . B beta, (i, j)]
             and [B -> gamma . , (j, k)]
             then add a new edge [A -> alpha B . beta, (i, k)].
+
+        With the lookahead filter, an incomplete new edge is only
+        added if the first element of beta can start with the token at
+        k; in particular, no incomplete edge ending at the end of the
+        sentence is added.
         '''
         if input_edge.is_complete():
             j = input_edge.get_start()
-            incomplete_edges = [edge for edge \
-                                in self.chart.get_edges_ending_at(j) \
-                                if not edge.is_complete()]
+            lhs = input_edge.get_prod_rule().get_lhs()
+            incomplete_edges = self.chart.get_incomplete_edges_ending_at(j, lhs)
             complete_edges = [input_edge]
         else:
             j = input_edge.get_end()
+            next_missing_dtr = input_edge.get_prod_rule().get_rhs_element(input_edge.get_dot())
             incomplete_edges = [input_edge]
-            complete_edges = [edge for edge \
-                              in self.chart.get_edges_starting_at(j) \
-                              if edge.is_complete()]
+            complete_edges = self.chart.get_complete_edges_starting_at(j, next_missing_dtr)
 
         ### New Edges ###
+        # Both lists are taken from the chart indexes, so every pairing
+        # of an incomplete with a complete edge is compatible
         for incomp_edge in incomplete_edges:
 
-            # Prepare info from incomplete edge that is necessary to ...
+            # Prepare info from incomplete edge
             prod_rule = incomp_edge.get_prod_rule()
             dot = incomp_edge.get_dot()
-            next_missing_dtr = prod_rule.get_rhs_element(dot)
+            i = incomp_edge.get_start()
+            next_symbol = None
+            if self.lookahead_filter and dot+1 < prod_rule.get_rhs_length():
+                next_symbol = prod_rule.get_rhs_element(dot+1)
             for comp_edge in complete_edges:
 
-                # ... check for compatibility with complete edges:
-                if next_missing_dtr == comp_edge.get_prod_rule().get_lhs():
+                # Prepare info from complete edge
+                k = comp_edge.get_end()
+                if next_symbol is not None and not self.can_start_at(next_symbol, k):
+                    continue
+
+                # Combine info from both edges,
+                # and use it to create new edge; its known daughters
+                # are those of the incomplete edge plus the complete one
+                new_prob = self.combine_scores(incomp_edge.get_prob(),
+                                               comp_edge.get_prob())
+                new_edge = Edge(i, k, prod_rule, dot+1, incomp_edge, comp_edge, new_prob)
+                self.stats.combinations += 1
 
-                    # Prepare additional info from incomplete edge
-                    i = incomp_edge.get_start()
-                    known_dtrs = incomp_edge.get_known_dtrs()
+                # Add new edge to queue
+                self.add_to_queue(new_edge)
 
-                    # Prepare info from complete edge
-                    k = comp_edge.get_end()
+    def add_to_queue(self, edge):
+        '''
+        Push edge to the queue unless it has been added to the chart
+        or the queue before, or it falls outside the beam
+
+        If admitting the edge to the beam displaces another edge that
+        is still queued, that edge is removed from the queue. When
+        packing, its item is forgotten as well, so that a later edge
+        with the same span, rule and dot is queued again; the item of
+        an edge that has already made it into the chart is kept.
+
+        When packing, an edge whose span, rule and dot are already
+        known is not queued but recorded as an alternative derivation
+        of the known edge (see pack_edge).
+        '''
+        stats = self.stats
+        stats.edges_created += 1
+        if self.hooks:
+            self.run_hooks('create', edge)
+        if self.packed:
+            packed_edge = self.items.get(edge.get_item_signature())
+            if packed_edge is not None:
+                stats.edges_packed += 1
+                self.pack_edge(packed_edge, edge)
+                return
+        elif self.queue.has_edge(edge) or self.chart.has_edge(edge):
+            stats.duplicates_rejected += 1
+            return
+        if self.beam is not None and edge.is_complete():
+            admitted, displaced = self.beam.admit(edge)
+            if not admitted:
+                return
+            if displaced is not None and self.queue.remove_edge(displaced) and self.packed:
+                signature = displaced.get_item_signature()
+                if self.items.get(signature) is displaced:
+                    del self.items[signature]
+        if self.packed:
+            self.items[edge.get_item_signature()] = edge
+        self.queue.add_edge(edge)
+        stats.edges_queued += 1
+        if self.queue.get_size() > stats.peak_queue_size:
+            stats.peak_queue_size = self.queue.get_size()
+        if self.hooks:
+            self.run_hooks('push', edge)
+        if self.left_corner_filter and not edge.is_complete():
+            self.expect(edge.get_end(), edge.get_prod_rule().get_rhs_element(edge.get_dot()))
+
+    def pack_edge(self, packed_edge, edge):
+        '''
+        Record edge as an alternative derivation of packed_edge, which
+        has the same span, rule and dot
+
+        If packed_edge is still waiting in a queue ordered by score
+        and edge is more probable, edge takes its place, so that the
+        queue is always ordered by the best derivation of each item;
+        it takes its place in the beam as well. Alternatives of edges
+        in the chart that would make an edge part of its own
+        derivation (through a cycle of unary rules) are dropped; they
+        can never be part of a best parse.
+        '''
+        if edge.get_prev() is None and edge.get_last_dtr() is None:
+            # Self-loop edge predicted again
+            return
+        if isinstance(self.queue, BestFirstQueue) and edge.get_prob() > packed_edge.get_prob() \
+               and self.queue.remove_edge(packed_edge):
+            for alternative in packed_edge.get_alternatives():
+                edge.add_alternative(alternative)
+            packed_edge.alts = None
+            self.items[edge.get_item_signature()] = edge
+            if self.beam is not None and edge.is_complete():
+                self.beam.replace(packed_edge, edge)
+            self.queue.add_edge(edge)
+            if self.hooks:
+                self.run_hooks('push', edge)
+        elif not self.chart.has_edge(packed_edge) \
+                 or not self.derives(edge.get_last_dtr(), packed_edge):
+            packed_edge.add_alternative(edge)
+
+    def derives(self, edge, target):
+        '''
+        Check whether the packed edge target is part of any
+        derivation of edge that covers the same span as target
+        '''
+        agenda = [edge]
+        visited = set()
+        while agenda:
+            edge = agenda.pop()
+            if edge is target:
+                return True
+            if edge in visited:
+                continue
+            visited.add(edge)
+            for alternative in edge.get_alternatives():
+                for tail in (alternative.get_prev(), alternative.get_last_dtr()):
+                    if tail is not None and tail.get_start() == target.get_start() \
+                           and tail.get_end() == target.get_end():
+                        agenda.append(tail)
+        return False
+
+    def get_astar_priority(self, edge):
+        '''
+        Return the A* priority of an edge as a log-probability
+
+        The priority is the score of the edge plus an estimate of the
+        best score of everything the edge still needs to become part
+        of a complete parse: the remaining RHS elements of its rule
+        and the context of its LHS (see Grammar.compute_estimates).
+        Since the estimates never underestimate, the first complete
+        parse taken from the queue is the most probable one.
+        '''
+        prod_rule = edge.get_prod_rule()
+        score = edge.get_prob()
+        if not self.log_space:
+            score = math.log(score) if score > 0 else float('-inf')
+        return score + self.grammar.get_completion_estimate(prod_rule, edge.get_dot()) \
+               + self.grammar.get_outside_estimate(prod_rule.get_lhs())
+
+    def get_rule_score(self, prod_rule):
+        '''
+        Return the score of a production rule: its log-probability
+        when working in log space, else its probability
+        '''
+        return prod_rule.get_log_prob() if self.log_space else prod_rule.get_prob()
 
-                    # Combine info from both edges,
-                    # and use it to create new edge
-                    new_dtrs = known_dtrs + [comp_edge]
-                    new_edge = Edge(i, k, prod_rule, dot+1, new_dtrs)
+    def combine_scores(self, incomp_score, comp_score):
+        '''
+        Return the score of an edge that was advanced over a complete
+        edge, given the scores of both edges
 
-                    # Add new edge to queue
-                    if not self.queue.has_edge(new_edge) and not self.chart.has_edge(new_edge):
-                        self.queue.add_edge(new_edge)
+        Since the score of an edge already accounts for its rule and
+        all of its known daughters, only the newly found daughter has
+        to be factored in, which makes this O(1) regardless of rule
+        length. In log space, factoring in is addition.
+        '''
+        if self.log_space:
+            return incomp_score + comp_score
+        return incomp_score * comp_score
 
     def search_rule(self, s_edge):
         'Scans queue for priority edges. See project report for detailed explanation'
@@ -290,50 +961,3 @@ class BottomUpChartParser:
                             dtrs = []
                             for mthr in mthrs:
                                 dtrs.extend(mthr.get_known_dtrs())
-
-    def display_parses(self):
-        '''
-        Display parse trees for all successful parses
-        '''
-        s_edges = self.chart.get_s_edges()
-
-        if len(s_edges) == 0:
-            raise ParseException("No parse could be found.")
-
-        for s_edge in s_edges:
-            parse_string = self.build_parse_string_from_edge(s_edge, 'S')
-            print self.add_indentation_to_parse_string(parse_string) + '\t' + str(s_edge.get_prob())
-
-    def build_parse_string_from_edge(self, edge, root):
-        '''
-        Recursively work your way down through the known daughters of
-        the input edge; return a bracketed structure representing the
-        parse tree.
-
-        In order to obtain a complete structure, this
-        method needs to be called with a string representing
-        the appropriate tree root (as the second argument)
-        '''
-        if not edge.get_known_dtrs() == []:
-            for dtr in edge.get_known_dtrs():
-                root += ' [ ' + dtr.get_prod_rule().get_lhs() + self.build_parse_string_from_edge(dtr, '') + ' ]'
-        return root
-
-    def add_indentation_to_parse_string(self, parse_string):
-        '''
-        Convert flat string representation of parse to appropriately
-        indented structure
-        '''
-        parse_string = '[ ' + parse_string + ' ]'
-        indented_string = ''
-        level = -1
-        for char in parse_string:
-            if char == '[':
-                level += 1
-                indented_string += '\n' + '\t'*level + char
-            elif char == ']':
-                level -= 1
-                indented_string += char
-            else:
-                indented_string += char
-        return indented_string
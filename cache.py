@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+import sys
+from collections import OrderedDict
+
+class LRUCache:
+    '''
+    This class implements a cache that evicts its least recently used
+    entries once their total size exceeds a bound
+
+    The size of an entry is given by the caller when the entry is
+    stored, as an estimate of the memory it takes in bytes (see
+    estimate_edges_size). An entry larger than the whole cache is not
+    stored at all.
+    '''
+
+    max_size = 0    # Maximum total size of all entries
+    size = 0        # Current total size of all entries
+    entries = None  # Ordered dictionary: key (key), (value, size)
+                    # (value); least recently used first
+    hits = 0
+    misses = 0
+    evictions = 0
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        '''
+        Return the value stored for key and mark it as most recently
+        used, or return default if there is none
+        '''
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            self.misses += 1
+            return default
+        self.entries[key] = entry
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, value, size):
+        '''
+        Store a value of the given size for key, evicting least
+        recently used entries as needed
+        '''
+        if key in self.entries:
+            self.size -= self.entries.pop(key)[1]
+        if size > self.max_size:
+            return
+        while self.size + size > self.max_size:
+            self.size -= self.entries.popitem(last=False)[1][1]
+            self.evictions += 1
+        self.entries[key] = (value, size)
+        self.size += size
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+    def get_stats(self):
+        '''
+        Return a dictionary of cache statistics
+        '''
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'size': self.size,
+                'max_size': self.max_size}
+
+
+def estimate_rules_size(prod_rules):
+    '''
+    Estimate the memory taken by a list of production rules, apart
+    from the symbols they share with the grammar, in bytes
+    '''
+    size = sys.getsizeof(prod_rules)
+    for prod_rule in prod_rules:
+        size += sys.getsizeof(prod_rule) + sys.getsizeof(prod_rule.__dict__) \
+                + sys.getsizeof(prod_rule.get_rhs())
+    return size
+
+def estimate_edges_size(edges):
+    '''
+    Estimate the memory taken by a list of edges, including all edges
+    they were built from, in bytes
+    '''
+    size = sys.getsizeof(edges)
+    seen = set()
+    agenda = list(edges)
+    while agenda:
+        edge = agenda.pop()
+        if edge is None or id(edge) in seen:
+            continue
+        seen.add(id(edge))
+        size += sys.getsizeof(edge)
+        agenda.append(edge.get_prev())
+        agenda.append(edge.get_last_dtr())
+    return size
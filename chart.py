@@ -6,10 +6,21 @@ class Chart:
 
     chart = None
     size = 0
+    index = None    # Dictionary: Edge signature (key), edge stored in
+                    # the chart (value); used for fast duplicate
+                    # detection
+    incomplete_index = None # Dictionary: (end node, next RHS element
+                            # needed) (key), list of incomplete edges
+                            # (value)
+    complete_index = None   # Dictionary: (start node, LHS) (key), list
+                            # of complete edges (value)
 
     def __init__(self, sentence_length):
         self.size = sentence_length+1
         self.chart = [[[] for col in range(self.size)] for row in range(self.size)]
+        self.index = {}
+        self.incomplete_index = {}
+        self.complete_index = {}
 
     def get_size(self):
         '''
@@ -17,12 +28,36 @@ class Chart:
         '''
         return self.size
 
+    def extend(self):
+        '''
+        Add a node at the end of the chart, i.e. make room for edges
+        over one more token
+        '''
+        for row in self.chart:
+            row.append([])
+        self.size += 1
+        self.chart.append([[] for col in range(self.size)])
+
+    def get_number_of_edges(self):
+        '''
+        Return the number of edges in the chart
+        '''
+        return len(self.index)
+
     def add_edge(self, edge):
         '''
         Add a newly created edge to the appropriate cell of the
         chart
         '''
         self.chart[edge.get_start()][edge.get_end()].append(edge)
+        self.index[edge.get_signature()] = edge
+        prod_rule = edge.get_prod_rule()
+        if edge.is_complete():
+            key = (edge.get_start(), prod_rule.get_lhs())
+            self.complete_index.setdefault(key, []).append(edge)
+        else:
+            key = (edge.get_end(), prod_rule.get_rhs_element(edge.get_dot()))
+            self.incomplete_index.setdefault(key, []).append(edge)
 
     def get_edges(self, i, j):
         '''
@@ -64,6 +99,20 @@ class Chart:
             edges.append(row[j])
         return [edge for edge in itertools.chain(*edges)]
 
+    def get_incomplete_edges_ending_at(self, j, symbol):
+        '''
+        Return all incomplete edges ending at node j that need a
+        constituent of category symbol to advance their dot
+        '''
+        return self.incomplete_index.get((j, symbol), [])
+
+    def get_complete_edges_starting_at(self, i, lhs):
+        '''
+        Return all complete edges starting at node i whose production
+        rule has the given LHS
+        '''
+        return self.complete_index.get((i, lhs), [])
+
     def get_s_edges(self):
         '''
         Return all edges from the chart which satisfy the following
@@ -73,19 +122,18 @@ class Chart:
         3) The edge is complete
         '''
         return [edge for edge \
-                in self.chart[0][self.size-1] \
-                if edge.is_complete() \
-                and edge.get_prod_rule().get_lhs() == 'S']
+                in self.get_complete_edges_starting_at(0, 'S') \
+                if edge.get_end() == self.size-1]
 
     def has_edge(self, edge):
         """
         Check if chart contains the input edge
+
+        Candidates are looked up by edge signature, so this takes
+        constant time regardless of the number of edges in the chart
         """
-        chart_edges = self.get_edges(edge.get_start(), edge.get_end())
-        for chart_edge in chart_edges:
-            if chart_edge.is_equal_to(edge):
-                return True
-        return False
+        chart_edge = self.index.get(edge.get_signature())
+        return chart_edge is not None and chart_edge.is_equal_to(edge)
 
     def print_chart(self):
         '''
@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+
+import math
+from edge import Edge
+from production_rule import ProductionRule
+from parse_exception import ParseException
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class CKYParser:
+    '''
+    This class implements a Viterbi CKY parser for grammars in which
+    no production rule has more than two RHS elements
+
+    Instead of processing one edge at a time, the parser computes the
+    best inside log-probability of *every* non-terminal over a span at
+    once. Each cell of the chart is a dense vector indexed by symbol
+    id, and rule applications are expressed as NumPy operations over
+    arrays holding the LHS ids, RHS ids and log-probabilities of all
+    rules of the grammar:
+
+    - Binary rules A -> B C are applied to a span (i, j) for all split
+      points k at once: the vectors of the cells (i, k) and (k, j) are
+      stacked into matrices, and a single gather/add yields the score
+      of every rule for every split point.
+    - Unary rules A -> B are applied to a cell repeatedly until no
+      score improves any more.
+
+    Only the n(n+1)/2 spans (i, j) with i < j have a cell; the cells
+    are stored as the rows of one matrix, ordered by start node and
+    then by end node (see get_span_row), so that the cells (i, k)
+    with the same start node are adjacent.
+
+    Back-pointers record the best rule (and split point) for each
+    symbol in each cell. The best parse is turned back into Edge
+    instances, so that it has exactly the same structure as a parse
+    produced by BottomUpChartParser.
+    '''
+
+    grammar = None
+    symbol_index = None # Dictionary: Non-terminal (key), row of that
+                        # non-terminal in the chart vectors (value)
+    binary_rules = None # List of binary production rules; the position
+                        # of a rule in this list is its id
+    binary_lhs = None   # Arrays holding LHS row, RHS rows and
+    binary_left = None  # log-probability of every binary rule
+    binary_right = None
+    binary_scores = None
+    unary_rules = None  # Same as above for unary rules
+    unary_lhs = None
+    unary_child = None
+    unary_scores = None
+
+    def __init__(self, grammar):
+        if numpy is None:
+            raise ParseException("The cky strategy requires NumPy. Please install it or choose another strategy.")
+        self.grammar = grammar
+        self.build_rule_tables()
+
+
+    ### START internal auxiliary methods ###
+
+    def build_rule_tables(self):
+        '''
+        Convert the production rules of the grammar into arrays of
+        symbol rows and log-probabilities
+
+        Raises ParseException if the grammar contains a rule with more
+        than two RHS elements.
+        '''
+        symbols = set()
+        for prod_rules in self.grammar.rules.values():
+            for prod_rule in prod_rules:
+                if prod_rule.get_rhs_length() > 2:
+                    raise ParseException("The cky strategy requires a binarized grammar, but the grammar contains %s" % prod_rule)
+                symbols.add(prod_rule.get_lhs())
+                symbols.update(prod_rule.get_rhs())
+        symbols.update(self.grammar.get_preterminal_probs())
+        self.symbol_index = dict((symbol, row) for row, symbol \
+                                 in enumerate(sorted(symbols, key=self.grammar.get_symbol_id)))
+
+        self.binary_rules = []
+        self.unary_rules = []
+        for prod_rules in self.grammar.rules.values():
+            for prod_rule in prod_rules:
+                if prod_rule.get_rhs_length() == 2:
+                    self.binary_rules.append(prod_rule)
+                else:
+                    self.unary_rules.append(prod_rule)
+
+        index = self.symbol_index
+        self.binary_lhs = numpy.array([index[rule.get_lhs()] for rule in self.binary_rules], dtype=numpy.intp)
+        self.binary_left = numpy.array([index[rule.get_rhs_element(0)] for rule in self.binary_rules], dtype=numpy.intp)
+        self.binary_right = numpy.array([index[rule.get_rhs_element(1)] for rule in self.binary_rules], dtype=numpy.intp)
+        self.binary_scores = numpy.array([rule.get_log_prob() for rule in self.binary_rules], dtype=numpy.float64)
+        self.unary_lhs = numpy.array([index[rule.get_lhs()] for rule in self.unary_rules], dtype=numpy.intp)
+        self.unary_child = numpy.array([index[rule.get_rhs_element(0)] for rule in self.unary_rules], dtype=numpy.intp)
+        self.unary_scores = numpy.array([rule.get_log_prob() for rule in self.unary_rules], dtype=numpy.float64)
+
+    def get_span_row(self, n, i, j):
+        '''
+        Return the row of the cell for span (i, j), i < j, in a chart
+        for n tokens; i and j may also be arrays of nodes
+        '''
+        return i*n - i*(i-1)//2 + j - i - 1
+
+    def fill_cell(self, cell, back_rule, back_split, rule_lhs, rule_scores, split, rule_offset):
+        '''
+        Enter scores of rule applications into a cell wherever they
+        improve on the current best score of their LHS
+
+        rule_scores holds one score per rule, split one split point
+        per rule (or -1 for unary rules); back-pointers are stored as
+        rule ids shifted by rule_offset, so that binary and unary rules
+        can share one back-pointer array. Returns True if any score
+        was improved.
+        '''
+        best = numpy.full(cell.shape, -numpy.inf)
+        numpy.maximum.at(best, rule_lhs, rule_scores)
+        improved = best > cell
+        if not improved.any():
+            return False
+        winners = numpy.flatnonzero((rule_scores == best[rule_lhs]) & improved[rule_lhs])
+        lhs = rule_lhs[winners]
+        cell[lhs] = rule_scores[winners]
+        back_rule[lhs] = winners + rule_offset
+        back_split[lhs] = split[winners] if split is not None else -1
+        return True
+
+    def apply_unary_rules(self, cell, back_rule, back_split):
+        '''
+        Apply unary rules to a cell until its scores stop improving
+
+        Since log-probabilities are never positive, a cycle of unary
+        rules can never improve a score, so this terminates after at
+        most one pass per non-terminal.
+        '''
+        if len(self.unary_rules) == 0:
+            return
+        offset = len(self.binary_rules)
+        for _ in xrange(len(self.symbol_index)):
+            scores = cell[self.unary_child] + self.unary_scores
+            if not self.fill_cell(cell, back_rule, back_split, self.unary_lhs,
+                                  scores, None, offset):
+                break
+
+    def load_cell(self, entry, i, cell, back_rule, back_split):
+        '''
+        Fill a cell starting at node i from a span cache entry (see
+        store_cell)
+        '''
+        rows, scores, rules, splits = entry
+        cell[rows] = scores
+        back_rule[rows] = rules
+        back_split[rows] = numpy.where(splits >= 0, splits + i, -1)
+
+    def store_cell(self, span_cache, key, i, cell, back_rule, back_split):
+        '''
+        Store the non-empty rows of a cell starting at node i in the
+        span cache, with split points relative to i
+        '''
+        rows = numpy.flatnonzero(cell > -numpy.inf)
+        splits = back_split[rows]
+        entry = (rows, cell[rows], back_rule[rows], numpy.where(splits >= 0, splits - i, -1))
+        span_cache.put(key, entry, sum(array.nbytes for array in entry))
+
+    def build_edge(self, tokens, i, j, row, score, back_rule, back_split, log_space):
+        '''
+        Recursively build the Edge instance for the best derivation of
+        the non-terminal in a given row of cell (i, j)
+        '''
+        span = self.get_span_row(len(tokens), i, j)
+        prob = score[span, row] if log_space else math.exp(score[span, row])
+        rule_id = back_rule[span, row]
+        if rule_id < 0:
+            # Lexical edge; back-pointers of lexical rules are encoded
+            # as -(index of lexical rule in the list for the word + 1)
+            prod_rule = self.grammar.get_lexical_rules(tokens[i])[-rule_id-1]
+            word_rule = ProductionRule(tokens[i], [], 1.0)
+            word_prob = word_rule.get_log_prob() if log_space else word_rule.get_prob()
+            word_edge = Edge(i, j, word_rule, 0, prob=word_prob)
+            return Edge(i, j, prod_rule, 1, None, word_edge, prob)
+
+        if rule_id < len(self.binary_rules):
+            prod_rule = self.binary_rules[rule_id]
+            k = back_split[span, row]
+            spans = [(i, k), (k, j)]
+        else:
+            prod_rule = self.unary_rules[rule_id - len(self.binary_rules)]
+            spans = [(i, j)]
+
+        rule_prob = prod_rule.get_log_prob() if log_space else prod_rule.get_prob()
+        edge = Edge(i, i, prod_rule, 0, prob=rule_prob)
+        for (start, end), symbol in zip(spans, prod_rule.get_rhs()):
+            dtr = self.build_edge(tokens, start, end, self.symbol_index[symbol],
+                                  score, back_rule, back_split, log_space)
+            dtr_prob = edge.get_prob() + dtr.get_prob() if log_space \
+                       else edge.get_prob() * dtr.get_prob()
+            edge = Edge(i, end, prod_rule, edge.get_dot()+1, edge, dtr, dtr_prob)
+        return edge
+
+
+    ### START external methods ###
+
+    def parse(self, tokens, goal='S', log_space=False, span_cache=None, check_time=None):
+        '''
+        Parse a list of tokens and return a complete edge for the best
+        parse with the goal symbol as LHS, or None if there is no such
+        parse
+
+        Since the cell of a span only depends on the tokens it covers,
+        cells can be shared between sentences: if span_cache (an
+        LRUCache) is given, cells for token sequences seen before are
+        copied from it instead of being computed, and computed cells
+        are stored in it. The cache must not be shared with another
+        CKYParser.
+
+        If check_time is given, it is called without arguments before
+        every cell is computed and may raise an exception to abort
+        parsing (see BottomUpChartParser.check_deadline).
+
+        Returns the edge along with the number of chart cells that
+        were computed.
+        '''
+        n = len(tokens)
+        size = len(self.symbol_index)
+        spans = n*(n+1)//2
+        score = numpy.full((spans, size), -numpy.inf)
+        back_rule = numpy.zeros((spans, size), dtype=numpy.int32)
+        back_split = numpy.full((spans, size), -1, dtype=numpy.int32)
+        cells = 0
+
+        # Lexical rules
+        for i, token in enumerate(tokens):
+            if check_time is not None:
+                check_time()
+            span = self.get_span_row(n, i, i+1)
+            cell = score[span]
+            if span_cache is not None:
+                key = (token,)
+                entry = span_cache.get(key)
+                if entry is not None:
+                    self.load_cell(entry, i, cell, back_rule[span], back_split[span])
+                    continue
+            for pos, prod_rule in enumerate(self.grammar.get_lexical_rules(token)):
+                row = self.symbol_index[prod_rule.get_lhs()]
+                if prod_rule.get_log_prob() > cell[row]:
+                    cell[row] = prod_rule.get_log_prob()
+                    back_rule[span, row] = -pos-1
+            self.apply_unary_rules(cell, back_rule[span], back_split[span])
+            cells += 1
+            if span_cache is not None:
+                self.store_cell(span_cache, key, i, cell, back_rule[span], back_split[span])
+
+        # Binary rules, by increasing span length
+        if len(self.binary_rules) > 0:
+            for length in xrange(2, n+1):
+                for i in xrange(0, n-length+1):
+                    j = i + length
+                    if check_time is not None:
+                        check_time()
+                    span = self.get_span_row(n, i, j)
+                    if span_cache is not None:
+                        key = tuple(tokens[i:j])
+                        entry = span_cache.get(key)
+                        if entry is not None:
+                            self.load_cell(entry, i, score[span], back_rule[span], back_split[span])
+                            continue
+                    # Cells (i, k) are adjacent rows, cells (k, j) are not
+                    splits = numpy.arange(i+1, j)
+                    first = self.get_span_row(n, i, i+1)
+                    left = score[first:first+length-1][:, self.binary_left]
+                    right = score[self.get_span_row(n, splits, j)][:, self.binary_right]
+                    candidates = left + right + self.binary_scores
+                    best_split = candidates.argmax(axis=0)
+                    rule_scores = candidates[best_split, numpy.arange(len(self.binary_rules))]
+                    self.fill_cell(score[span], back_rule[span], back_split[span],
+                                   self.binary_lhs, rule_scores, best_split + i + 1, 0)
+                    self.apply_unary_rules(score[span], back_rule[span], back_split[span])
+                    cells += 1
+                    if span_cache is not None:
+                        self.store_cell(span_cache, key, i, score[span], back_rule[span], back_split[span])
+
+        row = self.symbol_index.get(goal)
+        if row is None or n == 0 or score[self.get_span_row(n, 0, n), row] == -numpy.inf:
+            return None, cells
+        return self.build_edge(tokens, 0, n, row, score, back_rule, back_split, log_space), cells
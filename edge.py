@@ -1,27 +1,47 @@
 #!/usr/bin/env python
 
-class Edge:
-
-    start = -1         # Start node of the edge
-    end = -1           # End node of the edge
-    prob = -1.0        # Probability of the edge
-    prod_rule = None   # Production rule associated with the edge
-                       # (Object of type ProductionRule)
-    dot = -1           # Position of the dot on the RHS of prod_rule
-    complete = False   # An edge is complete/inactive if the dot is at
-                       # the end of the RHS
-    known_dtrs = None  # List containing Edge instances representing
-                       # immediate daughters of prod_rule that have
-                       # already been found, i.e. all elements
-                       # *before* the dot on the RHS of prod_rule
-
-    def __init__(self, start, end, prod_rule, dot, known_dtrs):
+class Edge(object):
+
+    # Edges are by far the most numerous objects created during
+    # parsing, so instances store their attributes in slots rather
+    # than in a per-instance dictionary:
+    #
+    # start      Start node of the edge
+    # end        End node of the edge
+    # prob       Probability of the edge; a log-probability if the
+    #            parser works in log space
+    # prod_rule  Production rule associated with the edge
+    #            (Object of type ProductionRule)
+    # dot        Position of the dot on the RHS of prod_rule
+    # complete   An edge is complete/inactive if the dot is at the end
+    #            of the RHS
+    # prev       Edge this edge was created from by advancing the dot
+    #            over one more daughter, or None
+    # dtr        Daughter (Edge instance) the dot was last advanced
+    #            over, or None
+    # alts       List of further edges with the same span, rule and
+    #            dot but other daughters, or None; only used when the
+    #            parser packs local ambiguity into a single edge
+    #
+    # Together, prev and dtr form a persistent linked list of the
+    # known daughters, i.e. all elements *before* the dot on the RHS
+    # of prod_rule: the known daughters of an edge are the known
+    # daughters of prev followed by dtr. Advancing the dot therefore
+    # takes constant time and space instead of copying a list of
+    # daughters.
+    __slots__ = ('start', 'end', 'prob', 'prod_rule', 'dot', 'complete',
+                 'prev', 'dtr', 'alts')
+
+    def __init__(self, start, end, prod_rule, dot, prev=None, dtr=None, prob=None):
         self.start = start
         self.end = end
         self.prod_rule = prod_rule
         self.dot = dot
-        self.known_dtrs = known_dtrs
-        self.prob = self.calc_prob(known_dtrs)
+        self.prev = prev
+        self.dtr = dtr
+        self.prob = self.calc_prob() if prob is None else prob
+        self.complete = False
+        self.alts = None
         self.set_complete()
 
     def __str__(self):
@@ -38,17 +58,22 @@ class Edge:
 
     ### START internal auxiliary methods ###
 
-    def calc_prob(self, known_dtrs):
+    def calc_prob(self):
         '''
         Calculate the probability of the edge as a whole
 
         The probability of an edge is the product of the probability
         of its production rule and the probabilities of all its known
-        daughters.
+        daughters. The probability of prev already covers the rule and
+        all but the last daughter, so only dtr has to be factored in.
+
+        This is only used if no probability is passed to the
+        constructor; the parser computes the probability of a new
+        edge itself, which also works in log space.
         '''
-        prob = self.prod_rule.get_prob()
-        for dtr in known_dtrs:
-            prob *= dtr.get_prob()
+        prob = self.prev.get_prob() if self.prev is not None else self.prod_rule.get_prob()
+        if self.dtr is not None:
+            prob *= self.dtr.get_prob()
         return prob
 
     def set_complete(self):
@@ -70,7 +95,10 @@ class Edge:
         return self.end
 
     def get_prob(self):
-        ''' Returns the probability of the edge '''
+        '''
+        Returns the probability of the edge, or its log-probability
+        if the edge was scored in log space
+        '''
         return self.prob
 
     def get_prod_rule(self):
@@ -99,8 +127,72 @@ class Edge:
         '''
         Return list of daughters that have already been found (through
         application of fundamental rule)
+
+        The list is rebuilt from the chain of back-pointers on every
+        call, so callers that need it repeatedly should keep a copy.
+        '''
+        known_dtrs = []
+        edge = self
+        while edge is not None and edge.dtr is not None:
+            known_dtrs.append(edge.dtr)
+            edge = edge.prev
+        known_dtrs.reverse()
+        return known_dtrs
+
+    def get_prev(self):
+        '''
+        Return the edge this edge was advanced from, or None
+        '''
+        return self.prev
+
+    def get_last_dtr(self):
+        '''
+        Return the daughter that was found last, or None if no
+        daughters are known
+        '''
+        return self.dtr
+
+    def get_signature(self):
+        '''
+        Return the canonical signature of the edge, i.e. a tuple of
+        its span, production rule, dot position and known daughters
+
+        Two edges with the same signature are built from the very same
+        rule and daughter edges, so containers can use the signature
+        as a dictionary key to look up equal edges in constant time
+        instead of comparing against every stored edge. The known
+        daughters are represented by prev and dtr: since duplicate
+        edges are never added to the chart, two edges advanced from
+        the same prev over the same dtr have the same daughters.
+        '''
+        return (self.start, self.end, self.prod_rule, self.dot, self.prev, self.dtr)
+
+    def get_item_signature(self):
+        '''
+        Return the signature of the edge without its daughters, i.e.
+        a tuple of its span, production rule and dot position
+
+        Edges with the same item signature can be used in exactly the
+        same way by the parser; they only differ in how they were
+        derived.
+        '''
+        return (self.start, self.end, self.prod_rule, self.dot)
+
+    def add_alternative(self, edge):
+        '''
+        Record an edge with the same item signature as an alternative
+        derivation of this edge
+        '''
+        if self.alts is None:
+            self.alts = []
+        self.alts.append(edge)
+
+    def get_alternatives(self):
+        '''
+        Return all derivations packed into this edge: the edge itself
+        followed by the alternatives recorded for it
         '''
-        return self.known_dtrs
+        return [self] + self.alts if self.alts else [self]
 
     def is_equal_to(self, edge):
         """
@@ -114,7 +206,7 @@ class Edge:
             return False
         elif not self.prob <= edge.get_prob():
             return False
-        elif not self.known_dtrs == edge.get_known_dtrs():
+        elif not (self.prev is edge.get_prev() and self.dtr is edge.get_last_dtr()):
             return False
         else:
             return True
@@ -1,29 +1,119 @@
 #!/usr/bin/env python
 
+import hashlib
+import marshal
+import math
+import os
 import re
+from array import array
+from cache import LRUCache, estimate_rules_size
+from lexicon_index import LexiconIndex, write_lexicon_index
 from production_rule import ProductionRule
 
+COMPILED_SUFFIX = '.compiled'   # Appended to the name of a grammar file
+                                # to obtain the name of its compiled form
+COMPILED_FORMAT = 4             # Version of the compiled grammar format;
+                                # bump whenever the layout changes
+LEXICON_SUFFIX = '.lexicon'     # Appended to the name of a grammar file
+                                # to obtain the name of its lexicon index
+LEXICON_CACHE_SIZE = 1 << 20    # Maximum size in bytes of the lexical
+                                # rules kept in memory when using a
+                                # lexicon index (see estimate_rules_size)
+INTERMEDIATE_PREFIX = '@'       # Prefix of the names of symbols
+                                # introduced by binarization; since words
+                                # may start with it too, such symbols are
+                                # recognized by Grammar.intermediate_symbols
+GOAL_SYMBOL = 'S'               # Root symbol of complete parses
+
 class Grammar:
 
-    lexicon = None   # Set; the parser uses this to quickly check the
-                     # input sentence for unknown words
+    lexicon = None   # Set (or LexiconIndex); the parser uses this to
+                     # quickly check the input sentence for unknown words
     rules = None     # Dictionary: First element on RHS (key), list of
-                     # associated production rules (value)
-
-    def __init__(self, grammar_file):
+                     # associated production rules (value); does not
+                     # include lexical rules
+    lexical_rules = None    # Dictionary: Lexical item (key), list of
+                            # production rules rewriting a POS tag as
+                            # that item (value); None if a lexicon
+                            # index is used
+    lexicon_index = None    # LexiconIndex object from which lexical rules
+                            # are loaded on demand, or None
+    lexical_cache = None    # LRUCache of the lexical rules loaded from
+                            # the lexicon index, by word
+    symbols = None   # List of all terminals and non-terminals; the
+                     # position of a symbol in this list is its id
+    symbol_ids = None   # Dictionary: Symbol (key), symbol id (value)
+    source_hash = None  # SHA-1 hex digest of the grammar file
+    inside_estimates = None     # Dictionary: Symbol (key), log-probability
+                                # of its most probable subtree (value)
+    outside_estimates = None    # Dictionary: Symbol (key), log-probability
+                                # of the most probable context it can
+                                # appear in below GOAL_SYMBOL (value)
+    completion_estimates = None # Dictionary: Production rule (key), list
+                                # of inside estimates of the remaining RHS
+                                # for every dot position (value)
+    left_corners = None # Dictionary: Non-terminal (key), bitset of the
+                        # ids of all symbols that can be its left
+                        # corner, including itself (value)
+    first_sets = None   # Dictionary: Symbol (key), bitset of the ids of
+                        # all preterminals it can start with (value)
+    intermediate_symbols = None # Set of the symbols introduced by
+                                # binarization
+    unary_closure = None    # Dictionary: (A, B) (key), (probability,
+                            # labels) of the most probable chain of
+                            # unary rules A =>+ B (value); see
+                            # compute_unary_closure
+    unary_chains = None     # Dictionary: Non-terminal B (key), list of
+                            # production rules A -> B that each stand
+                            # for a whole chain A =>+ B (value); see
+                            # compute_unary_chains
+    unary_chain_rules = None    # Set of all production rules in
+                                # unary_chains
+    branching_rules = None  # Dictionary: First RHS element (key), list
+                            # of associated production rules with more
+                            # than one RHS element (value)
+
+    def __init__(self, grammar_file=None, use_cache=True):
         self.lexicon = set()
         self.rules = {}
-        self.load_grammar(grammar_file)
-
-    def load_grammar(self, grammar_file):
+        self.lexical_rules = {}
+        self.symbols = []
+        self.symbol_ids = {}
+        self.intermediate_symbols = set()
+        self.completion_estimates = {}
+        if grammar_file is not None:
+            self.load_grammar(grammar_file, use_cache)
+
+    def load_grammar(self, grammar_file, use_cache=True):
         '''
         Load grammar rules from a grammar file, extract lexical items
         from the rule set and put them into the lexicon, then clean up
         all remaining quotation marks from the rules
+
+        Parsing a large grammar file is slow, so unless use_cache is
+        False the result is compiled into a compact binary form and
+        stored next to the grammar file. On subsequent loads the
+        compiled form is used instead, provided it was compiled from a
+        grammar file with identical content.
+
+        The lexical rules, which make up most of a large grammar, are
+        compiled into a separate lexicon index (see LexiconIndex).
+        When the compiled form is used, they are not loaded at all,
+        but looked up in the index for every word the parser asks for
+        (see get_lexical_rules).
         '''
+        self.source_hash = self.hash_grammar_file(grammar_file)
+        compiled_file = grammar_file + COMPILED_SUFFIX
+        lexicon_file = grammar_file + LEXICON_SUFFIX
+        if use_cache and self.load_compiled_grammar(compiled_file, lexicon_file):
+            return
         self.load_rules_from_file(grammar_file)
         self.extract_lexicon_from_rules()
         self.remove_remaining_quot_marks()
+        self.intern_symbols()
+        if use_cache:
+            self.compute_estimates()
+            self.save_compiled_grammar(compiled_file, lexicon_file)
 
 
     ### START internal auxiliary methods ###
@@ -152,13 +242,13 @@ class Grammar:
         rhs = re.split('\[', rhs_string)[0]
         return [token for token in rhs.split()]
 
-    def generate_prod_rule(self, lhs, rhs, prob):
+    def generate_prod_rule(self, lhs, rhs, prob, chain=()):
         '''
         *** Factory method ***
         This method returns a new instance of ProductionRule with the
-        given LHS, RHS, and probability
+        given LHS, RHS, probability and chain of collapsed unary nodes
         '''
-        return ProductionRule(lhs, rhs, prob)
+        return ProductionRule(lhs, rhs, prob, chain)
 
     def add_to_rules(self, prod_rule):
         '''
@@ -203,9 +293,9 @@ class Grammar:
         adding each item it strips away all quotation marks, as they
         are useless in the lexicon itself
         '''
-        self.lexicon = [key.strip('\'').strip('\"') for key \
+        self.lexicon = set([key.strip('\'').strip('\"') for key \
                             in self.rules.keys() \
-                            if key.startswith('\'') or key.startswith('\"')]
+                            if key.startswith('\'') or key.startswith('\"')])
 
     def remove_remaining_quot_marks(self):
         '''
@@ -222,27 +312,570 @@ class Grammar:
         When first building self.rules, quotation marks
         surrounding the lexical items are *not* stripped away.
 
-        This method removes all quotation marks. It should only be
-        called *after* the lexicon has been built.
+        This method removes all quotation marks and moves the rules
+        for lexical items from self.rules to self.lexical_rules. This
+        keeps lexical items apart from non-terminals of the same name
+        (e.g. the POS tag ',' and the punctuation mark ','). It
+        should only be called *after* the lexicon has been built.
         '''
         for rhs, prod_rules in self.rules.items():
             if rhs.startswith('\'') or rhs.startswith('\"'):
                 stripped_rhs = rhs.strip('\'').strip('\"')
-                self.rules[stripped_rhs] = self.rules.pop(rhs)
+                self.rules.pop(rhs)
                 for prod_rule in prod_rules:
                     prod_rule.rhs = [stripped_rhs]
+                self.add_to_lexical_rules(prod_rules)
             else:
                 pass
 
+    def add_to_lexical_rules(self, prod_rules):
+        '''
+        Adds lexical production rules to the index of lexical rules,
+        which is keyed by the lexical item on their RHS
+        '''
+        for prod_rule in prod_rules:
+            word = prod_rule.get_rhs_element(0)
+            self.lexical_rules.setdefault(word, []).append(prod_rule)
+
+    def intern_symbols(self):
+        '''
+        Assign a numeric id to every non-terminal occurring in the
+        rules; lexical items do not need one
+        '''
+        for prod_rules in self.rules.values():
+            for prod_rule in prod_rules:
+                self.get_symbol_id(prod_rule.get_lhs())
+                for symbol in prod_rule.get_rhs():
+                    self.get_symbol_id(symbol)
+        for preterminal in sorted(self.get_preterminal_probs()):
+            self.get_symbol_id(preterminal)
+
+    def hash_grammar_file(self, grammar_file):
+        '''
+        Return the SHA-1 hex digest of the content of a grammar file
+        '''
+        with open(grammar_file, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
+    def save_compiled_grammar(self, compiled_file, lexicon_file):
+        '''
+        Write the rules to disk in compiled form, and the lexical
+        rules to a lexicon index (see write_lexicon_index)
+
+        Symbols are stored once and referred to by id. Rules are
+        stored as parallel arrays of LHS ids, RHS ids (flattened, with
+        an array of offsets marking where each RHS ends) and
+        probabilities. The inside and outside estimates (see
+        compute_estimates) are stored by symbol id, so that they do
+        not have to be recomputed either. The file is written under a
+        temporary name and then renamed, so concurrent readers never
+        see a partial file. Failure to write is not an error; the
+        grammar is simply parsed again next time.
+        '''
+        lhs_ids = array('i')
+        rhs_ids = array('i')
+        rhs_offsets = array('i', [0])
+        probs = array('d')
+        for prod_rules in self.rules.values():
+            for prod_rule in prod_rules:
+                lhs_ids.append(self.symbol_ids[prod_rule.get_lhs()])
+                rhs_ids.extend([self.symbol_ids[symbol] for symbol in prod_rule.get_rhs()])
+                rhs_offsets.append(len(rhs_ids))
+                probs.append(prod_rule.get_prob())
+        inside_estimates = array('d', [self.inside_estimates.get(symbol, float('-inf')) \
+                                       for symbol in self.symbols])
+        outside_estimates = array('d', [self.outside_estimates.get(symbol, float('-inf')) \
+                                        for symbol in self.symbols])
+        compiled = {'format': COMPILED_FORMAT,
+                    'source_hash': self.source_hash,
+                    'symbols': self.symbols,
+                    'lhs': lhs_ids.tostring(),
+                    'rhs': rhs_ids.tostring(),
+                    'rhs_offsets': rhs_offsets.tostring(),
+                    'probs': probs.tostring(),
+                    'inside_estimates': inside_estimates.tostring(),
+                    'outside_estimates': outside_estimates.tostring()}
+        tmp_file = '%s.%s.tmp' % (compiled_file, os.getpid())
+        try:
+            write_lexicon_index(lexicon_file, self.source_hash, self.lexical_rules)
+            with open(tmp_file, 'wb') as f:
+                marshal.dump(compiled, f, 2)
+            os.rename(tmp_file, compiled_file)
+        except (IOError, OSError):
+            pass
+
+    def load_compiled_grammar(self, compiled_file, lexicon_file):
+        '''
+        Populate rules and symbol table from the compiled form of the
+        grammar, and open its lexicon index
+
+        Returns False (and leaves the grammar untouched) if there is
+        no compiled form or lexicon index, if either cannot be read,
+        is truncated or has an outdated format, or if either was
+        compiled from a different version of the grammar file
+        '''
+        try:
+            with open(compiled_file, 'rb') as f:
+                compiled = marshal.load(f)
+            lexicon_index = LexiconIndex(lexicon_file)
+        except (EnvironmentError, EOFError, ValueError, TypeError):
+            return False
+        if not isinstance(compiled, dict) \
+                or compiled.get('format') != COMPILED_FORMAT \
+                or compiled.get('source_hash') != self.source_hash \
+                or lexicon_index.get_source_hash() != self.source_hash:
+            lexicon_index.close()
+            return False
+
+        symbols = compiled['symbols']
+        lhs_ids = array('i')
+        lhs_ids.fromstring(compiled['lhs'])
+        rhs_ids = array('i')
+        rhs_ids.fromstring(compiled['rhs'])
+        rhs_offsets = array('i')
+        rhs_offsets.fromstring(compiled['rhs_offsets'])
+        probs = array('d')
+        probs.fromstring(compiled['probs'])
+        inside_estimates = array('d')
+        inside_estimates.fromstring(compiled['inside_estimates'])
+        outside_estimates = array('d')
+        outside_estimates.fromstring(compiled['outside_estimates'])
+
+        self.symbols = symbols
+        self.symbol_ids = dict((symbol, i) for i, symbol in enumerate(symbols))
+        for r in xrange(len(lhs_ids)):
+            rhs = [symbols[i] for i in rhs_ids[rhs_offsets[r]:rhs_offsets[r+1]]]
+            self.add_to_rules(self.generate_prod_rule(symbols[lhs_ids[r]], rhs, probs[r]))
+        self.lexicon_index = lexicon_index
+        self.lexicon = lexicon_index
+        self.lexical_rules = None
+        self.lexical_cache = LRUCache(LEXICON_CACHE_SIZE)
+        self.inside_estimates = dict(zip(symbols, inside_estimates))
+        self.outside_estimates = dict(zip(symbols, outside_estimates))
+        return True
+
+    def get_intermediate_symbol(self, prefix, intermediates):
+        '''
+        Return the intermediate symbol that stands for a sequence of
+        RHS elements, adding the rule that builds it if the symbol
+        does not exist yet
+
+        Sequences are built from left to right, so the symbol for
+        [A, B, C] is built from the symbol for [A, B] and C. This way,
+        all rules sharing a prefix of their RHS share the
+        intermediate symbols for that prefix. intermediates maps
+        sequences (as tuples) to the symbols already created.
+        '''
+        key = tuple(prefix)
+        if key not in intermediates:
+            if len(prefix) > 2:
+                rhs = [self.get_intermediate_symbol(prefix[:-1], intermediates), prefix[-1]]
+            else:
+                rhs = list(prefix)
+            intermediates[key] = INTERMEDIATE_PREFIX + '+'.join(prefix)
+            self.intermediate_symbols.add(intermediates[key])
+            self.add_to_rules(self.generate_prod_rule(intermediates[key], rhs, 1.0))
+        return intermediates[key]
+
 
     ### START external methods ###
 
+    def compute_unary_closure(self):
+        '''
+        Compute the most probable chain of unary rules between any
+        two non-terminals
+
+        Returns a dictionary mapping pairs (A, B) such that A =>+ B
+        via unary rules only to pairs (probability, labels), where
+        probability is the product of the rule probabilities along
+        the most probable chain and labels is a tuple of the
+        non-terminals strictly between A and B on that chain. Chains
+        from a symbol to itself are left out; since probabilities are
+        at most 1, they never make a derivation more probable.
+        '''
+        children = {}   # Dictionary: Non-terminal (key), list of
+                        # (RHS of unary rule, probability) (value)
+        closure = {}
+        for prod_rules in self.rules.values():
+            for prod_rule in prod_rules:
+                if prod_rule.get_rhs_length() != 1:
+                    continue
+                lhs = prod_rule.get_lhs()
+                rhs = prod_rule.get_rhs_element(0)
+                children.setdefault(lhs, []).append((rhs, prod_rule.get_prob()))
+                if lhs != rhs and closure.get((lhs, rhs), (-1.0,))[0] < prod_rule.get_prob():
+                    closure[(lhs, rhs)] = (prod_rule.get_prob(), ())
+
+        # Extend chains by one unary rule at a time until no chain
+        # can be improved any more
+        changed = True
+        while changed:
+            changed = False
+            for (upper, lower), (prob, path) in closure.items():
+                for child, child_prob in children.get(lower, []):
+                    candidate = prob * child_prob
+                    if upper != child and closure.get((upper, child), (-1.0,))[0] < candidate:
+                        closure[(upper, child)] = (candidate, path + (lower,))
+                        changed = True
+        return closure
+
+    def get_unary_closure(self):
+        '''
+        Return the closure of the unary rules (see
+        compute_unary_closure), computing it on first use
+        '''
+        if self.unary_closure is None:
+            self.unary_closure = self.compute_unary_closure()
+        return self.unary_closure
+
+    def compute_unary_chains(self):
+        '''
+        Turn the closure of the unary rules into production rules that
+        apply a whole chain of unary rules in a single step
+
+        For every chain A =>+ B (see compute_unary_closure), a rule
+        A -> B is created with the probability of the chain. The
+        labels of the non-terminals between A and B are recorded on
+        the rule, so that their nodes can be restored in parse trees.
+        The rules are not added to the grammar, whose rules stay as
+        they are; they are used by the parser instead (see
+        BottomUpChartParser.unary_rule).
+        '''
+        self.unary_chains = {}
+        self.unary_chain_rules = set()
+        for (upper, lower), (prob, labels) in self.get_unary_closure().items():
+            prod_rule = self.generate_prod_rule(upper, [lower], prob, labels)
+            self.unary_chains.setdefault(lower, []).append(prod_rule)
+            self.unary_chain_rules.add(prod_rule)
+
+    def get_unary_chains(self, symbol):
+        '''
+        Returns the list of production rules A -> symbol that apply
+        the most probable chain of unary rules A =>+ symbol (see
+        compute_unary_chains), computing them on first use
+        '''
+        if self.unary_chains is None:
+            self.compute_unary_chains()
+        return self.unary_chains.get(symbol, [])
+
+    def is_unary_chain_rule(self, prod_rule):
+        '''
+        Returns True if the production rule was created by
+        compute_unary_chains
+        '''
+        if self.unary_chains is None:
+            self.compute_unary_chains()
+        return prod_rule in self.unary_chain_rules
+
+    def compute_estimates(self):
+        '''
+        Compute inside and outside estimates for all symbols; these
+        are upper bounds on probabilities that are used as the
+        heuristic of A* parsing
+
+        The inside estimate of a symbol is the log-probability of the
+        most probable subtree rooted in it, over all possible yields.
+        The outside estimate of a symbol is the log-probability of the
+        most probable tree rooted in GOAL_SYMBOL that contains the
+        symbol, excluding the subtree below the symbol itself; the
+        other subtrees of that tree are estimated by their inside
+        estimates. Neither estimate looks at the sentence, so no
+        actual subtree or context can be more probable.
+
+        Both are computed by repeatedly relaxing the rules of the
+        grammar until no estimate improves. Since log-probabilities
+        are never positive, this terminates.
+        '''
+        inside = dict((preterminal, math.log(prob) if prob > 0 else float('-inf')) \
+                      for preterminal, prob in self.get_preterminal_probs().items())
+        prod_rules = [prod_rule for rules in self.rules.values() for prod_rule in rules]
+        changed = True
+        while changed:
+            changed = False
+            for prod_rule in prod_rules:
+                score = prod_rule.get_log_prob()
+                for symbol in prod_rule.get_rhs():
+                    score += inside.get(symbol, float('-inf'))
+                if score > inside.get(prod_rule.get_lhs(), float('-inf')):
+                    inside[prod_rule.get_lhs()] = score
+                    changed = True
+
+        outside = {GOAL_SYMBOL: 0.0}
+        changed = True
+        while changed:
+            changed = False
+            for prod_rule in prod_rules:
+                context = outside.get(prod_rule.get_lhs(), float('-inf'))
+                if context == float('-inf'):
+                    continue
+                rhs = prod_rule.get_rhs()
+                rhs_inside = [inside.get(symbol, float('-inf')) for symbol in rhs]
+                for k, symbol in enumerate(rhs):
+                    if rhs_inside[k] == float('-inf'):
+                        continue
+                    score = context + prod_rule.get_log_prob() \
+                            + sum(rhs_inside[:k]) + sum(rhs_inside[k+1:])
+                    if score > outside.get(symbol, float('-inf')):
+                        outside[symbol] = score
+                        changed = True
+
+        self.inside_estimates = inside
+        self.outside_estimates = outside
+        self.completion_estimates = {}
+
+    def get_outside_estimate(self, symbol):
+        '''
+        Returns the outside estimate of a symbol (see
+        compute_estimates), computing estimates on first use
+        '''
+        if self.outside_estimates is None:
+            self.compute_estimates()
+        return self.outside_estimates.get(symbol, float('-inf'))
+
+    def get_completion_estimate(self, prod_rule, dot):
+        '''
+        Returns the sum of the inside estimates of all RHS elements of
+        a production rule from the dot onwards, i.e. an upper bound on
+        the log-probability of what an edge with that rule and dot
+        still has to find
+        '''
+        if prod_rule not in self.completion_estimates:
+            if self.inside_estimates is None:
+                self.compute_estimates()
+            suffix_estimates = [0.0]
+            for symbol in reversed(prod_rule.get_rhs()):
+                suffix_estimates.append(suffix_estimates[-1] + \
+                                        self.inside_estimates.get(symbol, float('-inf')))
+            suffix_estimates.reverse()
+            self.completion_estimates[prod_rule] = suffix_estimates
+        return self.completion_estimates[prod_rule][dot]
+
+    def compute_left_corners(self):
+        '''
+        Compute the left-corner closure of all non-terminals
+
+        B is a left corner of A if A =>* B gamma, i.e. if B can be
+        the first symbol of something derived from A; every symbol is
+        a left corner of itself. The left corners of a symbol are
+        stored as a bitset over symbol ids (an integer with bit i set
+        for the symbol with id i), so that the left corners of
+        several symbols can be merged and tested in constant time.
+        They are computed by repeatedly merging the left corners of
+        the first RHS element of every rule into those of its LHS
+        until no bitset grows any more.
+        '''
+        firsts = set()  # Pairs (LHS, first RHS element) of all rules
+        for first, prod_rules in self.rules.items():
+            for prod_rule in prod_rules:
+                if prod_rule.get_lhs() != first:
+                    firsts.add((prod_rule.get_lhs(), first))
+        left_corners = dict((symbol, 1 << self.get_symbol_id(symbol)) \
+                            for pair in firsts for symbol in pair)
+        changed = True
+        while changed:
+            changed = False
+            for lhs, first in firsts:
+                merged = left_corners[lhs] | left_corners[first]
+                if merged != left_corners[lhs]:
+                    left_corners[lhs] = merged
+                    changed = True
+        self.left_corners = left_corners
+
+    def get_left_corners(self, symbol):
+        '''
+        Returns the bitset of the left corners of a symbol (see
+        compute_left_corners), computing them on first use
+        '''
+        if self.left_corners is None:
+            self.compute_left_corners()
+        if symbol not in self.left_corners:
+            return self.get_symbol_bit(symbol)
+        return self.left_corners[symbol]
+
+    def compute_first_sets(self):
+        '''
+        Compute the FIRST set of all symbols, i.e. the preterminals
+        (POS tags) that a symbol can start with, as bitsets over
+        symbol ids
+
+        Since the lexical rules are kept apart from the other rules,
+        the FIRST set of a symbol is just the set of its left corners
+        (see compute_left_corners) that are preterminals.
+        '''
+        preterminals = 0
+        for preterminal in self.get_preterminal_probs():
+            preterminals |= self.get_symbol_bit(preterminal)
+        if self.left_corners is None:
+            self.compute_left_corners()
+        self.first_sets = dict((symbol, left_corners & preterminals) \
+                               for symbol, left_corners in self.left_corners.items())
+        for preterminal in self.get_preterminal_probs():
+            self.first_sets.setdefault(preterminal, self.get_symbol_bit(preterminal))
+
+    def get_first_set(self, symbol):
+        '''
+        Returns the FIRST set of a symbol as a bitset (see
+        compute_first_sets), computing FIRST sets on first use
+        '''
+        if self.first_sets is None:
+            self.compute_first_sets()
+        return self.first_sets.get(symbol, 0)
+
+    def get_preterminal_set(self, word):
+        '''
+        Returns the bitset of the preterminals (POS tags) of a word
+        '''
+        preterminals = 0
+        for prod_rule in self.get_lexical_rules(word):
+            preterminals |= self.get_symbol_bit(prod_rule.get_lhs())
+        return preterminals
+
+    def binarize(self):
+        '''
+        Return a new grammar in which no rule has more than two RHS
+        elements
+
+        A rule A -> B C D [p] is replaced by A -> @B+C D [p] and
+        @B+C -> B C [1.0], where @B+C is an intermediate symbol (see
+        get_intermediate_symbol). The new grammar generates the same
+        trees with the same probabilities once intermediate nodes are
+        spliced into their parents.
+        '''
+        binarized = self.copy_lexicon()
+        binarized.intermediate_symbols.update(self.intermediate_symbols)
+        intermediates = {}
+        for prod_rules in self.rules.values():
+            for prod_rule in prod_rules:
+                rhs = prod_rule.get_rhs()
+                if len(rhs) > 2:
+                    rhs = [binarized.get_intermediate_symbol(rhs[:-1], intermediates), rhs[-1]]
+                binarized.add_to_rules(self.generate_prod_rule(prod_rule.get_lhs(), rhs,
+                                                               prod_rule.get_prob(),
+                                                               prod_rule.get_chain()))
+        binarized.intern_symbols()
+        return binarized
+
+    def copy_lexicon(self):
+        '''
+        Return a new grammar with the lexicon and lexical rules of
+        this one, but no other rules
+        '''
+        grammar = Grammar()
+        grammar.source_hash = self.source_hash
+        grammar.lexicon = self.lexicon
+        grammar.lexicon_index = self.lexicon_index
+        grammar.lexical_cache = self.lexical_cache
+        if self.lexical_rules is None:
+            grammar.lexical_rules = None
+        else:
+            grammar.lexical_rules = dict((word, list(prod_rules)) for word, prod_rules \
+                                         in self.lexical_rules.items())
+        return grammar
+
+    def is_binary(self):
+        '''
+        Returns True if no rule has more than two RHS elements
+        '''
+        for prod_rules in self.rules.values():
+            for prod_rule in prod_rules:
+                if prod_rule.get_rhs_length() > 2:
+                    return False
+        return True
+
+    def is_intermediate_symbol(self, symbol):
+        '''
+        Returns True if the symbol was introduced by binarization
+        '''
+        return symbol in self.intermediate_symbols
+
+    def get_symbol_id(self, symbol):
+        '''
+        Return the numeric id of a symbol, assigning a new id if the
+        symbol has not been seen before
+        '''
+        if symbol not in self.symbol_ids:
+            self.symbol_ids[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        return self.symbol_ids[symbol]
+
+    def get_symbol_bit(self, symbol):
+        '''
+        Return the bitset that contains only the given symbol
+        '''
+        return 1 << self.get_symbol_id(symbol)
+
+    def get_symbol(self, symbol_id):
+        '''
+        Return the symbol with the given numeric id
+        '''
+        return self.symbols[symbol_id]
+
+    def get_source_hash(self):
+        '''
+        Return the SHA-1 hex digest of the grammar file; this
+        identifies the version of the grammar
+        '''
+        return self.source_hash
+
     def get_lexicon(self):
         '''
         Returns the lexicon
         '''
         return self.lexicon
 
+    def get_lexical_rules(self, word):
+        '''
+        Returns list of lexical production rules whose RHS is the
+        given word, i.e. one rule per POS tag the word can have
+
+        With a lexicon index, the rules are looked up in the index and
+        kept in a small cache, so that frequent words are only looked
+        up once.
+        '''
+        if self.lexicon_index is None:
+            return self.lexical_rules.get(word, [])
+        prod_rules = self.lexical_cache.get(word)
+        if prod_rules is None:
+            prod_rules = [self.generate_prod_rule(preterminal, [word], prob) \
+                          for preterminal, prob in self.lexicon_index.get_entries(word)]
+            self.lexical_cache.put(word, prod_rules, estimate_rules_size(prod_rules))
+        return prod_rules
+
+    def iter_lexical_rules(self):
+        '''
+        Generate all lexical production rules, in sorted order of
+        their lexical items
+        '''
+        if self.lexicon_index is None:
+            for word in sorted(self.lexical_rules):
+                for prod_rule in self.lexical_rules[word]:
+                    yield prod_rule
+        else:
+            for word, preterminal, prob in self.lexicon_index.iter_entries():
+                yield self.generate_prod_rule(preterminal, [word], prob)
+
+    def get_preterminal_probs(self):
+        '''
+        Returns a dictionary mapping every preterminal (POS tag) to
+        the probability of its most probable lexical rule
+        '''
+        if self.lexicon_index is not None:
+            return self.lexicon_index.get_preterminal_probs()
+        probs = {}
+        for prod_rules in self.lexical_rules.values():
+            for prod_rule in prod_rules:
+                lhs = prod_rule.get_lhs()
+                probs[lhs] = max(probs.get(lhs, 0.0), prod_rule.get_prob())
+        return probs
+
+    def get_preterminals(self, word):
+        '''
+        Returns list of (POS tag, probability) pairs for the given
+        word
+        '''
+        return [(prod_rule.get_lhs(), prod_rule.get_prob()) \
+                for prod_rule in self.get_lexical_rules(word)]
+
 
     # TODO: I still don't like this function name
     def get_possible_parent_rules(self, token):
@@ -255,6 +888,18 @@ class Grammar:
         else:
             return []
 
+    def get_branching_parent_rules(self, token):
+        '''
+        Returns list of production rules with more than one RHS
+        element whose first RHS element is the given token
+        '''
+        if self.branching_rules is None:
+            self.branching_rules = {}
+            for key, prod_rules in self.rules.items():
+                self.branching_rules[key] = [prod_rule for prod_rule in prod_rules \
+                                             if prod_rule.get_rhs_length() > 1]
+        return self.branching_rules.get(token, [])
+
     def print_rules(self):
         '''
         Pretty-prints all production rules of the grammar
@@ -262,3 +907,5 @@ class Grammar:
         for prod_rules in self.rules.values():
             for prod_rule in prod_rules:
                 print prod_rule.__str__()
+        for prod_rule in self.iter_lexical_rules():
+            print prod_rule.__str__()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+
+import heapq
+import itertools
+from edge import Edge
+
+class KBestExtractor:
+    '''
+    This class implements lazy extraction of the k best derivations
+    from a packed chart, following Algorithm 3 of Huang & Chiang
+    (2005), "Better k-best parsing"
+
+    In a packed chart, every edge stands for all derivations with its
+    span, production rule and dot position. Each of these derivations
+    is one of the alternatives of the edge (see
+    Edge.get_alternatives), combined with some derivation of the
+    alternative's back-pointers prev and dtr, the *tails*. A
+    derivation is therefore identified by an alternative and the
+    ranks of the derivations chosen for its tails.
+
+    Derivations of an edge are only computed on demand: the best
+    derivation of an edge is the best of its alternatives combined
+    with the best derivations of their tails. Once the j-th best
+    derivation has been taken, its successors -- the same alternative
+    with the rank of a single tail increased by one -- become
+    candidates for the (j+1)-th best. Finding one more derivation of
+    a tree thus costs O(|tree| log k) heap operations.
+    '''
+
+    rule_score = None       # Function returning the score of a rule
+    combine_scores = None   # Function combining the score of an edge
+                            # with the score of a new daughter
+    check_time = None   # Function called before the derivations of an
+                        # edge are computed and before every parse is
+                        # extracted; it may raise an exception to
+                        # abort the extraction (None: not called)
+    derivations = None  # Dictionary: Edge (key), list of (score,
+                        # alternative, ranks of tails) found so far,
+                        # best first (value)
+    candidates = None   # Dictionary: Edge (key), heap of candidate
+                        # derivations (value)
+    seen = None         # Dictionary: Edge (key), set of (alternative,
+                        # ranks) pushed to candidates (value)
+    expanded = None     # Dictionary: Edge (key), number of derivations
+                        # whose successors have been pushed (value)
+    edges = None        # Dictionary: (Edge, rank) (key), unpacked Edge
+                        # representing that derivation (value)
+    counter = None      # Source of sequence numbers for tie-breaking
+
+    def __init__(self, rule_score, combine_scores, check_time=None):
+        self.rule_score = rule_score
+        self.combine_scores = combine_scores
+        self.check_time = check_time
+        self.derivations = {}
+        self.candidates = {}
+        self.seen = {}
+        self.expanded = {}
+        self.edges = {}
+        self.counter = itertools.count()
+
+
+    ### START internal auxiliary methods ###
+
+    def get_tails(self, alternative):
+        '''
+        Return the back-pointers of an alternative that are set
+        '''
+        return [tail for tail in (alternative.get_prev(), alternative.get_last_dtr()) \
+                if tail is not None]
+
+    def score(self, alternative, ranks):
+        '''
+        Return the score of an alternative combined with the
+        derivations of the given ranks of its tails, or None if a
+        tail has fewer derivations
+        '''
+        prev = alternative.get_prev()
+        dtr = alternative.get_last_dtr()
+        if prev is None and dtr is None:
+            return alternative.get_prob()
+        if prev is not None:
+            derivation = self.get_kth_derivation(prev, ranks[0])
+            if derivation is None:
+                return None
+            score = derivation[0]
+        else:
+            score = self.rule_score(alternative.get_prod_rule())
+        if dtr is not None:
+            derivation = self.get_kth_derivation(dtr, ranks[-1])
+            if derivation is None:
+                return None
+            score = self.combine_scores(score, derivation[0])
+        return score
+
+    def push_candidate(self, edge, alternative, ranks):
+        '''
+        Add a derivation of edge to its candidates unless it has been
+        added before or does not exist
+        '''
+        key = (alternative, ranks)
+        if key in self.seen[edge]:
+            return
+        self.seen[edge].add(key)
+        score = self.score(alternative, ranks)
+        if score is not None:
+            heapq.heappush(self.candidates[edge],
+                           (-score, next(self.counter), (score, alternative, ranks)))
+
+
+    ### START external methods ###
+
+    def get_kth_derivation(self, edge, k):
+        '''
+        Return the k-th best derivation (counting from 0) of an edge
+        as a tuple (score, alternative, ranks of tails), or None if
+        the edge has no more than k derivations
+        '''
+        if edge not in self.derivations:
+            if self.check_time is not None:
+                self.check_time()
+            self.derivations[edge] = []
+            self.candidates[edge] = []
+            self.seen[edge] = set()
+            self.expanded[edge] = 0
+            for alternative in edge.get_alternatives():
+                self.push_candidate(edge, alternative, (0,)*len(self.get_tails(alternative)))
+
+        derivations = self.derivations[edge]
+        candidates = self.candidates[edge]
+        while len(derivations) <= k:
+            if self.expanded[edge] < len(derivations):
+                score, alternative, ranks = derivations[-1]
+                for i in range(len(ranks)):
+                    self.push_candidate(edge, alternative,
+                                        ranks[:i] + (ranks[i]+1,) + ranks[i+1:])
+                self.expanded[edge] = len(derivations)
+            if not candidates:
+                return None
+            derivations.append(heapq.heappop(candidates)[2])
+        return derivations[k]
+
+    def get_edge(self, edge, k):
+        '''
+        Return the k-th best derivation of an edge as an unpacked
+        Edge instance, i.e. one whose daughters are unpacked as well
+        '''
+        if (edge, k) not in self.edges:
+            score, alternative, ranks = self.get_kth_derivation(edge, k)
+            tails = [self.get_edge(tail, rank) for tail, rank \
+                     in zip(self.get_tails(alternative), ranks)]
+            prev = tails[0] if alternative.get_prev() is not None else None
+            dtr = tails[-1] if alternative.get_last_dtr() is not None else None
+            self.edges[(edge, k)] = Edge(edge.get_start(), edge.get_end(),
+                                         edge.get_prod_rule(), edge.get_dot(),
+                                         prev, dtr, score)
+        return self.edges[(edge, k)]
+
+    def get_k_best(self, edges, k):
+        '''
+        Return the k best derivations of a list of edges, best first,
+        as unpacked Edge instances; k = -1 returns all derivations
+        '''
+        heap = []
+        for edge in edges:
+            derivation = self.get_kth_derivation(edge, 0)
+            if derivation is not None:
+                heapq.heappush(heap, (-derivation[0], next(self.counter), edge, 0))
+        k_best = []
+        while heap and (k == -1 or len(k_best) < k):
+            if self.check_time is not None:
+                self.check_time()
+            _, _, edge, rank = heapq.heappop(heap)
+            k_best.append(self.get_edge(edge, rank))
+            derivation = self.get_kth_derivation(edge, rank+1)
+            if derivation is not None:
+                heapq.heappush(heap, (-derivation[0], next(self.counter), edge, rank+1))
+        return k_best
@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+
+import marshal
+import mmap
+import os
+import struct
+from array import array
+
+LEXICON_FORMAT = 1  # Version of the index file format; bump whenever
+                    # the layout changes
+
+class LexiconIndex:
+    '''
+    This class implements a read-only index of the lexical rules of a
+    grammar, which is kept in a file and memory-mapped
+
+    Only the pages of the file that are actually looked at are read,
+    and since they are shared with every other process mapping the
+    same file, the lexicon costs next to no private memory per
+    process. Words are looked up by binary search. The file is
+    written by write_lexicon_index and laid out as follows:
+
+    - the length of the header, as a 4-byte integer
+    - the header, a marshalled dictionary holding the format, the hash
+      of the grammar file, the number of words and entries, the
+      preterminals along with the probability of their most probable
+      lexical rule, and the position of each of the sections below
+    - probs: the probability of every entry (8-byte floats)
+    - word_offsets: the position of every word in words, plus the end
+      of the last word (4-byte integers)
+    - entry_offsets: the position of the first entry of every word,
+      plus the number of entries (4-byte integers)
+    - tags: the preterminal of every entry, as its position in the
+      list of preterminals (4-byte integers)
+    - words: all words, sorted and concatenated
+
+    An index can be used like a set of words: it supports len, in and
+    iteration in sorted order.
+    '''
+
+    source_hash = None  # SHA-1 hex digest of the grammar file
+    preterminals = None # List of preterminals; entries refer to them by
+                        # position
+    preterminal_probs = None    # List: position of preterminal (index),
+                                # probability of its most probable
+                                # lexical rule (value)
+    size = 0        # Number of words
+    mapped = None   # mmap object of the index file
+    sections = None # Dictionary: section name (key), position of the
+                    # section in the file (value)
+
+    def __init__(self, index_file):
+        '''
+        Map an index file into memory
+
+        Raises EnvironmentError if the file cannot be read or mapped
+        and ValueError if it is empty, truncated or not an index file
+        of the current format.
+        '''
+        with open(index_file, 'rb') as f:
+            self.mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self.read_header(index_file)
+        except ValueError:
+            self.mapped.close()
+            raise
+
+
+    ### START internal auxiliary methods ###
+
+    def read_header(self, index_file):
+        '''
+        Read the header of the mapped index file and check that the
+        file is complete
+
+        Raises ValueError if it is not.
+        '''
+        try:
+            header_length = struct.unpack_from('=i', self.mapped, 0)[0]
+            header = marshal.loads(self.mapped[4:4+header_length])
+        except (struct.error, EOFError, TypeError):
+            raise ValueError('%s is not a lexicon index' % index_file)
+        if not isinstance(header, dict) or header.get('format') != LEXICON_FORMAT:
+            raise ValueError('%s is not a lexicon index of the current format' % index_file)
+        self.source_hash = header['source_hash']
+        self.preterminals = header['preterminals']
+        self.preterminal_probs = header['preterminal_probs']
+        self.size = header['words']
+        self.sections = header['sections']
+        # The words are the last section, so the file is complete if
+        # it reaches the end of the last word
+        try:
+            words_length = struct.unpack_from('=i', self.mapped,
+                                              self.sections['word_offsets'] + 4*self.size)[0]
+        except struct.error:
+            words_length = None
+        if words_length is None or self.sections['words'] + words_length > len(self.mapped):
+            raise ValueError('%s is truncated' % index_file)
+
+    def get_word(self, i):
+        '''
+        Return the i-th word in sorted order
+        '''
+        start, end = struct.unpack_from('=2i', self.mapped, self.sections['word_offsets'] + 4*i)
+        words = self.sections['words']
+        return self.mapped[words+start:words+end]
+
+    def find(self, word):
+        '''
+        Return the position of a word in sorted order, or -1 if it is
+        not in the index
+        '''
+        if isinstance(word, unicode):
+            word = word.encode('utf-8')
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self.get_word(middle) < word:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.size and self.get_word(low) == word:
+            return low
+        return -1
+
+    def get_entries_at(self, i):
+        '''
+        Return the entries of the i-th word as a list of (preterminal,
+        probability) pairs
+        '''
+        start, end = struct.unpack_from('=2i', self.mapped, self.sections['entry_offsets'] + 4*i)
+        tags = struct.unpack_from('=%di' % (end-start), self.mapped, self.sections['tags'] + 4*start)
+        probs = struct.unpack_from('=%dd' % (end-start), self.mapped, self.sections['probs'] + 8*start)
+        return [(self.preterminals[tag], prob) for tag, prob in zip(tags, probs)]
+
+
+    ### START external methods ###
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, word):
+        return self.find(word) >= 0
+
+    def __iter__(self):
+        for i in xrange(self.size):
+            yield self.get_word(i)
+
+    def get_entries(self, word):
+        '''
+        Return the lexical rules of a word as a list of (preterminal,
+        probability) pairs, in the order of the grammar file; the list
+        is empty if the word is unknown
+        '''
+        i = self.find(word)
+        if i < 0:
+            return []
+        return self.get_entries_at(i)
+
+    def iter_entries(self):
+        '''
+        Generate (word, preterminal, probability) for every lexical
+        rule, in sorted order of the words
+        '''
+        for i in xrange(self.size):
+            word = self.get_word(i)
+            for preterminal, prob in self.get_entries_at(i):
+                yield word, preterminal, prob
+
+    def get_preterminal_probs(self):
+        '''
+        Return a dictionary mapping every preterminal to the
+        probability of its most probable lexical rule
+        '''
+        return dict(zip(self.preterminals, self.preterminal_probs))
+
+    def get_source_hash(self):
+        return self.source_hash
+
+    def close(self):
+        self.mapped.close()
+
+
+def write_lexicon_index(index_file, source_hash, lexical_rules):
+    '''
+    Write the lexical rules of a grammar, given as a dictionary
+    mapping every word to a list of production rules, to an index
+    file (see LexiconIndex)
+
+    The file is written under a temporary name and then renamed, so
+    that concurrent readers never see a partial file.
+    '''
+    preterminal_ids = {}
+    preterminal_probs = []
+    words = sorted(lexical_rules)
+    word_offsets = array('i', [0])
+    entry_offsets = array('i', [0])
+    tags = array('i')
+    probs = array('d')
+    for word in words:
+        word_offsets.append(word_offsets[-1] + len(word))
+        for prod_rule in lexical_rules[word]:
+            lhs = prod_rule.get_lhs()
+            if lhs not in preterminal_ids:
+                preterminal_ids[lhs] = len(preterminal_probs)
+                preterminal_probs.append(0.0)
+            tag = preterminal_ids[lhs]
+            preterminal_probs[tag] = max(preterminal_probs[tag], prod_rule.get_prob())
+            tags.append(tag)
+            probs.append(prod_rule.get_prob())
+        entry_offsets.append(len(tags))
+    preterminals = sorted(preterminal_ids, key=preterminal_ids.get)
+
+    sections = [('probs', probs.tostring()),
+                ('word_offsets', word_offsets.tostring()),
+                ('entry_offsets', entry_offsets.tostring()),
+                ('tags', tags.tostring()),
+                ('words', ''.join(words))]
+    header = {'format': LEXICON_FORMAT,
+              'source_hash': source_hash,
+              'preterminals': preterminals,
+              'preterminal_probs': preterminal_probs,
+              'words': len(words),
+              'sections': {}}
+    # The positions of the sections depend on the length of the
+    # header, which includes them; placeholders of the same length
+    # keep the header from changing its length when they are filled in
+    for name, data in sections:
+        header['sections'][name] = 0
+    header_length = len(marshal.dumps(header, 2))
+    position = (4 + header_length + 7) // 8 * 8
+    for name, data in sections:
+        header['sections'][name] = position
+        position += len(data)
+
+    encoded = marshal.dumps(header, 2)
+    assert len(encoded) == header_length, 'Header of %s changed its length' % index_file
+
+    tmp_file = '%s.%s.tmp' % (index_file, os.getpid())
+    with open(tmp_file, 'wb') as f:
+        f.write(struct.pack('=i', header_length))
+        f.write(encoded)
+        f.write('\0' * ((4 + header_length + 7) // 8 * 8 - 4 - header_length))
+        for name, data in sections:
+            f.write(data)
+    os.rename(tmp_file, index_file)
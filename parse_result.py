@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+
+import json
+
+class ParseTree:
+    '''
+    This class implements a node of a parse tree
+
+    Trees are built from complete edges lazily: the children of a node
+    are only created when they are asked for, so that serializing one
+    of many parses does not cost anything for the others. Trees built
+    with a binarized grammar are converted back to the original
+    grammar on the way: daughters labeled with intermediate symbols
+    are spliced into their mother, and nodes removed by collapsing
+    unary rules are restored. Leaves are labeled with the tokens of
+    the sentence.
+
+    All serializers work iteratively, so they neither recurse nor
+    build intermediate strings per node.
+    '''
+
+    label = None    # Symbol or token at this node
+    start = -1      # Span of the node in the sentence
+    end = -1
+    score = None    # Probability of the subtree (log-probability in
+                    # log space)
+    edge = None     # Edge the node is built from
+    grammar = None  # Grammar the edge was built with
+    chain = ()      # Labels of the nodes still to be restored between
+                    # this node and the daughters of edge
+    children = None # List of ParseTree objects, or None if they have
+                    # not been created yet
+
+    def __init__(self, label, edge, grammar, chain=()):
+        self.label = label
+        self.start = edge.get_start()
+        self.end = edge.get_end()
+        self.score = edge.get_prob()
+        self.edge = edge
+        self.grammar = grammar
+        self.chain = chain
+
+
+    ### START internal auxiliary methods ###
+
+    def create_children(self):
+        '''
+        Create the children of the node from the known daughters of
+        its edge, or the next node of its chain
+        '''
+        if self.chain:
+            return [ParseTree(self.chain[0], self.edge, self.grammar, self.chain[1:])]
+        children = []
+        agenda = self.edge.get_known_dtrs()
+        agenda.reverse()
+        while agenda:
+            dtr = agenda.pop()
+            prod_rule = dtr.get_prod_rule()
+            lhs = prod_rule.get_lhs()
+            # Leaves are labeled with words, which may happen to look
+            # like intermediate symbols
+            if prod_rule.get_rhs_length() > 0 and self.grammar.is_intermediate_symbol(lhs):
+                dtrs = dtr.get_known_dtrs()
+                dtrs.reverse()
+                agenda.extend(dtrs)
+            else:
+                children.append(ParseTree(lhs, dtr, self.grammar, prod_rule.get_chain()))
+        return children
+
+
+    ### START external methods ###
+
+    def get_label(self):
+        return self.label
+
+    def get_start(self):
+        return self.start
+
+    def get_end(self):
+        return self.end
+
+    def get_score(self):
+        return self.score
+
+    def get_edge(self):
+        return self.edge
+
+    def get_children(self):
+        if self.children is None:
+            self.children = self.create_children()
+        return self.children
+
+    def is_leaf(self):
+        return len(self.get_children()) == 0
+
+    def to_penn(self):
+        '''
+        Return the tree in Penn Treebank bracketing, e.g.
+        (S (NP (NN Jack)) (VP ...))
+        '''
+        parts = []
+        agenda = [self]
+        while agenda:
+            node = agenda.pop()
+            if node is None:
+                parts[-1] += ')'
+                continue
+            children = node.get_children()
+            if not children:
+                parts.append(node.label)
+                continue
+            parts.append('(' + node.label)
+            agenda.append(None)
+            agenda.extend(reversed(children))
+        return ' '.join(parts)
+
+    def to_brackets(self, indent=False):
+        '''
+        Return the tree in the bracketing used by BOP, e.g.
+        [ S [ NP [ NN [ Jack ] ] ] [ VP ... ] ]
+
+        If indent is True, every node starts on a new line, indented
+        by one tab per level.
+        '''
+        parts = []
+        agenda = [(self, 0)]
+        while agenda:
+            node, level = agenda.pop()
+            if node is None:
+                parts.append(']')
+                continue
+            parts.append('\n' + '\t'*level + '[' if indent else '[')
+            parts.append(node.label)
+            agenda.append((None, level))
+            agenda.extend((child, level+1) for child in reversed(node.get_children()))
+        return ' '.join(parts)
+
+    def to_indented(self):
+        return self.to_brackets(True)
+
+    def as_dict(self):
+        '''
+        Return the tree as nested dictionaries with the keys label,
+        start, end, score and children; leaves only have a label
+        '''
+        root = {}
+        agenda = [(self, root)]
+        while agenda:
+            node, target = agenda.pop()
+            target['label'] = node.label
+            children = node.get_children()
+            if children:
+                target['start'] = node.start
+                target['end'] = node.end
+                target['score'] = node.score
+                target['children'] = [{} for _ in children]
+                agenda.extend(zip(children, target['children']))
+        return root
+
+    def to_json(self):
+        '''
+        Return the tree as compact JSON (see as_dict)
+        '''
+        return json.dumps(self.as_dict(), separators=(',', ':'))
+
+
+class ParseResult:
+    '''
+    This class holds the parses of a sentence along with statistics
+    on parsing it
+
+    Parses are kept as complete S edges; the corresponding trees are
+    only built when asked for (see ParseTree).
+    '''
+
+    tokens = None       # List of tokens of the sentence
+    edges = None        # List of complete S edges, one per parse
+    stats = None        # ParseStats object of the parse
+    grammar = None      # Grammar the edges were built with
+    log_space = False   # If True, scores are log-probabilities
+    trees = None        # List of ParseTree objects, or None if they
+                        # have not been created yet
+
+    def __init__(self, tokens, edges, stats, grammar, log_space=False):
+        self.tokens = tokens
+        self.edges = edges
+        self.stats = stats
+        self.grammar = grammar
+        self.log_space = log_space
+
+    def __len__(self):
+        return len(self.edges)
+
+    def __iter__(self):
+        return iter(self.get_trees())
+
+    def get_tokens(self):
+        return self.tokens
+
+    def get_edges(self):
+        return self.edges
+
+    def get_stats(self):
+        return self.stats
+
+    def get_trees(self):
+        '''
+        Return a ParseTree object for every parse
+        '''
+        if self.trees is None:
+            self.trees = [ParseTree(edge.get_prod_rule().get_lhs(), edge, self.grammar,
+                                    edge.get_prod_rule().get_chain()) for edge in self.edges]
+        return self.trees
+
+    def get_best(self):
+        '''
+        Return the tree of the most probable parse, or None if there
+        is no parse
+        '''
+        if not self.edges:
+            return None
+        return max(self.get_trees(), key=ParseTree.get_score)
+
+    def as_dict(self):
+        return {'tokens': self.tokens,
+                'log_space': self.log_space,
+                'parses': [tree.as_dict() for tree in self.get_trees()]}
+
+    def to_json(self):
+        return json.dumps(self.as_dict(), separators=(',', ':'))
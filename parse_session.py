@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+from chart import Chart
+from parse_exception import ParseException
+from parse_stats import ParseStats
+from queue_exception import QueueException
+
+class ParseSession:
+    '''
+    This class implements incremental parsing of a sentence whose
+    tokens arrive one at a time, e.g. from a speech recognizer
+
+    Sessions are created with BottomUpChartParser.start_session.
+    Every call to feed appends a token to the sentence: the chart is
+    extended by one node, the edges for the token are created, and
+    the agenda is run until it is empty. After that, the chart holds
+    every edge over the tokens seen so far, so that only the work
+    involving the next token remains to be done when it arrives.
+    finish returns the best parses of the whole sentence.
+
+    Since the agenda is always run to completion, the parser packs
+    local ambiguity (see BottomUpChartParser.parse), and the
+    parses are extracted from the packed chart when the session is
+    finished. With the lookahead filter, edges ending at the last
+    node are not filtered, since the next token is not known yet.
+    '''
+
+    parser = None   # BottomUpChartParser object doing the parsing
+    strategy = None # Parsing strategy: fifo, bestfirst or astar
+    tokens = None   # List of tokens fed so far
+    iterations = 0  # Number of iterations of the agenda so far
+    finished = False
+
+    def __init__(self, parser, strategy='bestfirst'):
+        if strategy not in ('fifo', 'bestfirst', 'astar'):
+            raise QueueException('Invalid strategy (%s) for incremental parsing. Please try again and choose a strategy from the following set: {fifo, bestfirst, astar}' % strategy)
+        self.parser = parser
+        self.strategy = strategy
+        self.tokens = []
+
+        parser.stats = ParseStats(strategy)
+        if parser.hooks:
+            parser.run_hooks('start', self.tokens)
+        parser.stats.start_phase('initialize')
+        parser.sentence_length = 0
+        parser.chart = Chart(0)
+        parser.initialize_filters([])
+        parser.initialize_beam(None, None)
+        parser.initialize_queue(strategy)
+        parser.packed = True
+        parser.items = {}
+        parser.stats.stop_phase()
+
+    def feed(self, token):
+        '''
+        Append a token to the sentence and do all parsing work that
+        only depends on the tokens seen so far
+
+        Raises ParseException if the token is unknown; the session
+        can be continued with another token.
+        '''
+        if self.finished:
+            raise ParseException("The session is finished already.")
+        parser = self.parser
+        parser.stats.start_phase('preprocess')
+        if parser.get_unknown_words([token]):
+            parser.stats.stop_phase()
+            raise ParseException("Sentence contains unknown words (%s). Please try again!" % token)
+
+        parser.stats.start_phase('initialize')
+        node = len(self.tokens)
+        self.tokens.append(token)
+        parser.sentence_length += 1
+        parser.chart.extend()
+        parser.extend_filters(token)
+        parser.init_token(node, token)
+
+        parser.stats.start_phase('agenda')
+        self.iterations += parser.run_agenda(-1, self.strategy, parser.get_deadline())
+        parser.stats.stop_phase()
+
+    def finish(self, number_of_parses=1):
+        '''
+        End the sentence and return its number_of_parses most
+        probable parses (all of them if number_of_parses is -1), best
+        first, as a ParseResult object
+        '''
+        if self.finished:
+            raise ParseException("The session is finished already.")
+        self.finished = True
+        parser = self.parser
+        parser.packed = False
+        parser.items = None
+        return parser.extract_k_best(self.tokens, number_of_parses, self.iterations)
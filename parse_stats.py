@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+
+import time
+
+class ParseStats:
+    '''
+    This class collects statistics on a single call to parse
+
+    Counters are updated by the parser as it goes; the number of
+    edges per chart cell is taken from the chart once parsing is
+    done. Times are wall-clock seconds per phase of parsing:
+
+    preprocess  tokenizing and checking for unknown words
+    initialize  setting up chart, queue and filters, and creating
+                the edges for the tokens
+    agenda      processing the queue (or running the CKY parser)
+    extract     extracting the k best parses from a packed chart
+    '''
+
+    strategy = None
+    sentence_length = 0
+    iterations = 0          # Edges taken from the queue (or chart cells
+                            # filled by the CKY parser)
+    edges_created = 0       # Edges offered to the queue
+    edges_queued = 0        # Edges actually pushed to the queue
+    duplicates_rejected = 0 # Edges rejected because the queue or chart
+                            # already contained them
+    edges_packed = 0        # Edges recorded as alternatives of another
+                            # edge instead of being queued
+    beam_pruned = 0         # Edges rejected or displaced by the beam
+    predictions = 0         # Edges created by the predict rule
+    combinations = 0        # Edges created by the fundamental rule
+    peak_queue_size = 0     # Largest number of edges on the queue at once
+    chart_edges = 0         # Number of edges in the chart
+    parses = 0              # Number of parses found
+    cached = False          # True if the parses were taken from the
+                            # result cache
+    spans_cached = 0        # Chart cells taken from the span cache by
+                            # the CKY parser
+    cell_sizes = None       # Dictionary: (start, end) (key), number of
+                            # edges in that chart cell (value); empty
+                            # cells are left out
+    times = None            # Dictionary: phase (key), seconds (value)
+    phase = None            # Phase currently being timed
+    phase_start = None      # Time at which the current phase started
+
+    def __init__(self, strategy=None):
+        self.strategy = strategy
+        self.cell_sizes = {}
+        self.times = {}
+
+    def __str__(self):
+        '''
+        Return a one-line summary of the statistics
+        '''
+        return '%s iterations, %s edges created (%s duplicates, %s packed, %s pruned), peak queue %s, %s chart edges, %.3fs' \
+               % (self.iterations, self.edges_created, self.duplicates_rejected,
+                  self.edges_packed, self.beam_pruned, self.peak_queue_size,
+                  self.chart_edges, sum(self.times.values()))
+
+    def start_phase(self, phase):
+        '''
+        Stop timing the current phase, if any, and start timing the
+        given one
+        '''
+        self.stop_phase()
+        self.phase = phase
+        self.phase_start = time.time()
+
+    def stop_phase(self):
+        '''
+        Stop timing the current phase and add its duration to times
+        '''
+        if self.phase is not None:
+            self.times[self.phase] = self.times.get(self.phase, 0.0) + time.time() - self.phase_start
+            self.phase = None
+
+    def record_chart(self, chart):
+        '''
+        Record the number of edges per cell of a filled chart
+        '''
+        self.cell_sizes = {}
+        for i in xrange(chart.get_size()):
+            for j in xrange(i, chart.get_size()):
+                size = len(chart.get_edges(i, j))
+                if size > 0:
+                    self.cell_sizes[(i, j)] = size
+        self.chart_edges = chart.get_number_of_edges()
+
+    def get_edges_rejected(self):
+        '''
+        Return the number of edges that were created but not queued
+        '''
+        return self.edges_created - self.edges_queued
+
+    def as_dict(self):
+        '''
+        Return the statistics as a dictionary that can be serialized
+        as JSON; cell sizes become a list of [start, end, size]
+        '''
+        return {'strategy': self.strategy,
+                'sentence_length': self.sentence_length,
+                'iterations': self.iterations,
+                'edges_created': self.edges_created,
+                'edges_queued': self.edges_queued,
+                'edges_rejected': self.get_edges_rejected(),
+                'duplicates_rejected': self.duplicates_rejected,
+                'edges_packed': self.edges_packed,
+                'beam_pruned': self.beam_pruned,
+                'predictions': self.predictions,
+                'combinations': self.combinations,
+                'peak_queue_size': self.peak_queue_size,
+                'chart_edges': self.chart_edges,
+                'parses': self.parses,
+                'cached': self.cached,
+                'spans_cached': self.spans_cached,
+                'cell_sizes': [[i, j, size] for (i, j), size in sorted(self.cell_sizes.items())],
+                'times': dict(self.times)}
@@ -1,7 +1,25 @@
 #!/usr/bin/env python
 
+import json
+import math
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
 import unittest
+from StringIO import StringIO
+import benchmark
+import bop_batch
+import bop_server
 from bottom_up_chart_parser import BottomUpChartParser
+from cache import LRUCache
+from grammar import Grammar, COMPILED_SUFFIX, LEXICON_SUFFIX
+from parse_exception import ParseException
+from queue_exception import QueueException
+from trace_analyzer import TraceAnalysis
+from tracer import Tracer
 
 class Test(unittest.TestCase):
     bop = None
@@ -18,6 +36,491 @@ class Test(unittest.TestCase):
         self.bop.chart.print_chart()
         self.tearDown()
 
+class LogSpaceTest(unittest.TestCase):
+
+    def runTest(self):
+        sentence = 'big cats and dogs saw Jack with telescopes'
+        bop = BottomUpChartParser("sample.pcfg")
+        bop.parse(sentence, -1, 'fifo')
+        probs = sorted(edge.get_prob() for edge in bop.chart.get_s_edges())
+
+        log_bop = BottomUpChartParser("sample.pcfg", log_space=True)
+        log_bop.parse(sentence, -1, 'fifo')
+        log_probs = sorted(edge.get_prob() for edge in log_bop.chart.get_s_edges())
+
+        self.assertEqual(len(probs), len(log_probs))
+        for prob, log_prob in zip(probs, log_probs):
+            self.assertAlmostEqual(math.log(prob), log_prob)
+
+class CompiledGrammarTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.grammar_file = os.path.join(self.tmp_dir, 'sample.pcfg')
+        shutil.copy('sample.pcfg', self.grammar_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def rule_strings(self, grammar):
+        return sorted(str(rule) for rules in grammar.rules.values() for rule in rules)
+
+    def runTest(self):
+        parsed = Grammar(self.grammar_file)
+        self.assertTrue(os.path.exists(self.grammar_file + COMPILED_SUFFIX))
+        compiled = Grammar(self.grammar_file)
+        self.assertEqual(self.rule_strings(parsed), self.rule_strings(compiled))
+        self.assertEqual(sorted(parsed.get_lexicon()), sorted(compiled.get_lexicon()))
+
+        # Lexical rules are looked up in the lexicon index on demand
+        self.assertTrue(os.path.exists(self.grammar_file + LEXICON_SUFFIX))
+        self.assertTrue(parsed.lexicon_index is None and compiled.lexicon_index is not None)
+        self.assertEqual([str(rule) for rule in parsed.iter_lexical_rules()],
+                         [str(rule) for rule in compiled.iter_lexical_rules()])
+        for word in parsed.get_lexicon():
+            self.assertEqual(compiled.get_preterminals(word), parsed.get_preterminals(word))
+        self.assertTrue('Jack' in compiled.get_lexicon())
+        self.assertFalse('Jill' in compiled.get_lexicon())
+        self.assertEqual(compiled.get_lexical_rules('Jill'), [])
+        self.assertTrue(compiled.get_lexical_rules('Jack') is compiled.get_lexical_rules('Jack'))
+        self.assertTrue(compiled.lexical_cache.size > len(compiled.lexical_cache))
+
+        # A truncated or empty lexicon index is compiled again
+        lexicon_file = self.grammar_file + LEXICON_SUFFIX
+        for length in [os.path.getsize(lexicon_file) - 1, 0]:
+            with open(lexicon_file, 'r+b') as f:
+                f.truncate(length)
+            recompiled = Grammar(self.grammar_file)
+            self.assertTrue(recompiled.lexicon_index is None)
+            self.assertEqual(self.rule_strings(recompiled), self.rule_strings(parsed))
+        recompiled = Grammar(self.grammar_file)
+        self.assertTrue(recompiled.lexicon_index is not None)
+        self.assertEqual(sorted(recompiled.get_lexicon()), sorted(parsed.get_lexicon()))
+
+        # Compiled form is ignored once the grammar file changes
+        with open(self.grammar_file, 'a') as f:
+            f.write("\nIV -> 'slept' [1.0]")
+        self.assertTrue('slept' in Grammar(self.grammar_file).get_lexicon())
+
+class BinarizationTest(unittest.TestCase):
+
+    sentence = 'big cats and dogs saw Jack with telescopes'
+
+    def parses(self, bop, number_of_parses, strategy):
+        return sorted((round(tree.get_score(), 15), tree.to_penn()) \
+                      for tree in bop.parse(self.sentence, number_of_parses, strategy))
+
+    def runTest(self):
+        expected = self.parses(BottomUpChartParser("sample.pcfg"), -1, 'fifo')
+        self.assertEqual(len(expected), 4)
+        for collapse_unaries in [False, True]:
+            bop = BottomUpChartParser("sample.pcfg", binarize=True,
+                                      collapse_unaries=collapse_unaries)
+            self.assertTrue(bop.grammar.is_binary())
+            self.assertEqual(self.parses(bop, -1, 'fifo'), expected)
+            self.assertEqual(self.parses(bop, 1, 'cky'), expected[-1:])
+        self.assertEqual(self.parses(BottomUpChartParser("sample.pcfg"), 1, 'cky'), expected[-1:])
+
+class IntermediateSymbolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.grammar_file = os.path.join(self.tmp_dir, 'sample.pcfg')
+        shutil.copy('sample.pcfg', self.grammar_file)
+        with open(self.grammar_file, 'a') as f:
+            f.write("\nNN -> '@' [0.5] | '@N+CC' [0.5]")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def runTest(self):
+        # Words may look like the symbols introduced by binarization
+        for binarize in [False, True]:
+            bop = BottomUpChartParser(self.grammar_file, binarize=binarize)
+            self.assertFalse(bop.grammar.is_intermediate_symbol('@'))
+            tree = bop.parse('big cats saw @', 1, 'bestfirst').get_best()
+            self.assertEqual(tree.to_penn(), '(S (NP (JJ big) (N cats)) (VP (TV saw) (NP (NN @))))')
+            # Even a word named like an intermediate symbol is a leaf
+            self.assertEqual(bop.grammar.is_intermediate_symbol('@N+CC'), binarize)
+            tree = bop.parse('big cats saw @N+CC', 1, 'bestfirst').get_best()
+            self.assertEqual(tree.to_penn(), '(S (NP (JJ big) (N cats)) (VP (TV saw) (NP (NN @N+CC))))')
+
+class UnaryClosureTest(unittest.TestCase):
+
+    def setUp(self):
+        # NP =>+ NN is more probable via NX than directly
+        self.tmp_dir = tempfile.mkdtemp()
+        self.grammar_file = os.path.join(self.tmp_dir, 'sample.pcfg')
+        shutil.copy('sample.pcfg', self.grammar_file)
+        with open(self.grammar_file, 'a') as f:
+            f.write("\nNP -> NX [0.1]\nNX -> NN [1.0]")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def rule_strings(self, grammar):
+        return sorted(str(rule) for rules in grammar.rules.values() for rule in rules)
+
+    def runTest(self):
+        sentence = 'big cats and dogs saw Jack with telescopes'
+        bop = BottomUpChartParser(self.grammar_file)
+        for filters in [False, True]:
+            collapsed = BottomUpChartParser(self.grammar_file, collapse_unaries=True,
+                                            left_corner_filter=filters, lookahead_filter=filters)
+            self.assertEqual(self.rule_strings(collapsed.grammar), self.rule_strings(bop.grammar))
+            for strategy in ['bestfirst', 'astar', 'cky']:
+                expected = bop.parse(sentence, 1, strategy).get_best()
+                tree = collapsed.parse(sentence, 1, strategy).get_best()
+                self.assertTrue('(NP (NX (NN Jack)))' in tree.to_penn())
+                self.assertEqual(tree.to_penn(), expected.to_penn())
+                self.assertAlmostEqual(tree.get_score(), expected.get_score())
+                if strategy != 'cky':
+                    self.assertTrue(collapsed.stats.iterations < bop.stats.iterations)
+            tree = collapsed.parse(sentence, 1, 'bestfirst', packed=True).get_best()
+            self.assertEqual(tree.to_penn(), expected.to_penn())
+
+class BeamTest(unittest.TestCase):
+
+    def runTest(self):
+        bop = BottomUpChartParser("sample.pcfg")
+        bop.parse('big cats and dogs saw Jack with telescopes', -1, 'bestfirst', beam_size=1)
+        s_edges = bop.chart.get_s_edges()
+        self.assertEqual(len(s_edges), 1)
+        self.assertAlmostEqual(s_edges[0].get_prob(), 3.024e-07)
+        self.assertTrue(bop.beam.get_stats()['pruned_by_top_k'] > 0)
+
+        # Unary projections are not pruned by their own daughters
+        for beam_threshold in [0.1, 0.2, 0.5]:
+            result = bop.parse('big cats and dogs saw Jack with telescopes', 1, 'bestfirst',
+                               beam_threshold=beam_threshold)
+            self.assertAlmostEqual(result.get_best().get_score(), 3.024e-07)
+
+        # Beam and packed chart together
+        sentence = 'Jack saw Jack with Jack with Jack and Jack with Jack'
+        for strategy in ['fifo', 'bestfirst', 'astar']:
+            full = dict((tree.to_penn(), tree.get_score()) for tree in bop.parse(sentence, -1, strategy))
+            for beam_size in [1, 2]:
+                result = bop.parse(sentence, -1, strategy, beam_size=beam_size, packed=True)
+                self.assertAlmostEqual(result.get_best().get_score(), max(full.values()))
+                penns = [tree.to_penn() for tree in result]
+                self.assertEqual(len(set(penns)), len(penns))
+                for tree in result:
+                    self.assertAlmostEqual(tree.get_score(), full[tree.to_penn()])
+                signatures = [edge.get_item_signature() for i in xrange(len(sentence.split()))
+                              for edge in bop.chart.get_edges_starting_at(i)]
+                self.assertEqual(len(set(signatures)), len(signatures))
+                # The beam holds the edges that made it into the chart,
+                # not the ones they took over from in the queue
+                for kept in bop.beam.kept.values():
+                    for score, _, edge in kept:
+                        self.assertEqual(score, edge.get_prob())
+                        cell = bop.chart.get_edges(edge.get_start(), edge.get_end())
+                        self.assertTrue(any(chart_edge is edge for chart_edge in cell))
+
+class CKYTest(unittest.TestCase):
+
+    def runTest(self):
+        for log_space in [False, True]:
+            bop = BottomUpChartParser("sample.pcfg", log_space=log_space)
+            for sentence in ['big cats and dogs saw Jack with telescopes',
+                             'small mice and cats gave Jack dogs']:
+                expected = bop.parse(sentence, 1, 'bestfirst').get_best()
+                tree = bop.parse(sentence, 1, 'cky').get_best()
+                self.assertAlmostEqual(tree.get_score(), expected.get_score())
+                self.assertEqual(tree.to_penn(), expected.to_penn())
+            self.assertEqual(len(bop.parse('Jack', 1, 'cky')), 0)
+            self.assertRaises(QueueException, bop.parse, 'Jack saw dogs', 2, 'cky')
+        # Only spans (i, j) with i < j have a cell, each in its own row
+        cky_parser = bop.get_cky_parser()
+        for n in xrange(1, 6):
+            rows = [cky_parser.get_span_row(n, i, j) for i in xrange(n) for j in xrange(i+1, n+1)]
+            self.assertEqual(rows, range(n*(n+1)//2))
+
+class AStarTest(unittest.TestCase):
+
+    def runTest(self):
+        bop = BottomUpChartParser("sample.pcfg")
+        for sentence in ['big cats and dogs saw Jack with telescopes',
+                         'small mice and cats gave Jack dogs']:
+            bop.parse(sentence, -1, 'fifo')
+            best = max(edge.get_prob() for edge in bop.chart.get_s_edges())
+            bop.parse(sentence, 1, 'astar')
+            self.assertAlmostEqual(bop.chart.get_s_edges()[0].get_prob(), best)
+
+class KBestTest(unittest.TestCase):
+
+    sentence = 'big cats and dogs saw Jack with telescopes'
+
+    def parse_strings(self, result):
+        return [(round(tree.get_score(), 15), tree.to_penn()) for tree in result]
+
+    def runTest(self):
+        bop = BottomUpChartParser("sample.pcfg")
+        expected = sorted(self.parse_strings(bop.parse(self.sentence, -1, 'fifo')), reverse=True)
+        chart_edges = bop.stats.chart_edges
+        self.assertEqual(self.parse_strings(bop.parse(self.sentence, -1, 'fifo', packed=True)), expected)
+        self.assertTrue(bop.stats.edges_packed > 0)
+        self.assertTrue(bop.stats.chart_edges < chart_edges)
+        for strategy in ['fifo', 'bestfirst', 'astar']:
+            self.assertEqual(self.parse_strings(bop.parse_k_best(self.sentence, -1, strategy)),
+                             expected)
+            self.assertEqual(self.parse_strings(bop.parse_k_best(self.sentence, 2, strategy)),
+                             expected[:2])
+
+class TimeLimitTest(unittest.TestCase):
+
+    def runTest(self):
+        sentence = 'big cats and dogs saw Jack with telescopes'
+        bop = BottomUpChartParser("sample.pcfg")
+        expected = len(bop.parse_k_best(sentence, -1))
+        # Extracting parses from a packed chart stops at the deadline
+        self.assertRaises(ParseException, bop.unpack_parses, -1, time.time() - 1)
+        self.assertEqual(len(bop.unpack_parses(-1, time.time() + 60)), expected)
+        bop.time_limit = 0
+        self.assertRaises(ParseException, bop.parse, sentence, 1, 'cky')
+        self.assertRaises(ParseException, bop.parse_k_best, sentence, -1)
+        bop.time_limit = 60
+        self.assertEqual(len(bop.parse(sentence, 1, 'cky')), 1)
+        self.assertEqual(len(bop.parse_k_best(sentence, -1)), expected)
+
+class SessionTest(unittest.TestCase):
+
+    def runTest(self):
+        sentence = 'big cats and dogs saw Jack with telescopes'
+        for filters in [False, True]:
+            bop = BottomUpChartParser("sample.pcfg", left_corner_filter=filters,
+                                      lookahead_filter=filters)
+            expected = [(tree.get_score(), tree.to_penn()) for tree in bop.parse_k_best(sentence, -1)]
+            session = bop.start_session()
+            for token in sentence.split():
+                session.feed(token)
+                self.assertEqual(bop.chart.get_size(), len(session.tokens)+1)
+            self.assertEqual([(tree.get_score(), tree.to_penn()) for tree in session.finish(-1)],
+                             expected)
+            self.assertRaises(ParseException, session.feed, 'cats')
+
+class ParseResultTest(unittest.TestCase):
+
+    def runTest(self):
+        bop = BottomUpChartParser("sample.pcfg")
+        result = bop.parse('small mice ate', 1, 'fifo')
+        self.assertEqual(len(result), 1)
+        tree = result.get_best()
+        self.assertEqual(tree.to_penn(), '(S (NP (JJ small) (N mice)) (VP (IV ate)))')
+        self.assertEqual(tree.to_brackets(), '[ S [ NP [ JJ [ small ] ] [ N [ mice ] ] ] [ VP [ IV [ ate ] ] ] ]')
+        self.assertEqual(tree.to_indented().replace('\n', '').replace('\t', ''), tree.to_brackets())
+        self.assertTrue(tree.to_indented().endswith('\n\t\t\t[ ate ] ] ] ]'))
+        parse = json.loads(result.to_json())['parses'][0]
+        self.assertEqual((parse['label'], parse['start'], parse['end']), ('S', 0, 3))
+        self.assertAlmostEqual(parse['score'], tree.get_score())
+        self.assertEqual([child['label'] for child in parse['children']], ['NP', 'VP'])
+        self.assertEqual(parse['children'][1]['children'][0]['children'], [{'label': 'ate'}])
+
+class LeftCornerTest(unittest.TestCase):
+
+    def runTest(self):
+        sentence = 'big cats and dogs saw Jack with telescopes'
+        bop = BottomUpChartParser("sample.pcfg")
+        filtered = BottomUpChartParser("sample.pcfg", left_corner_filter=True)
+        self.assertEqual(filtered.grammar.get_left_corners('S') & filtered.grammar.get_symbol_bit('JJ'),
+                         filtered.grammar.get_symbol_bit('JJ'))
+        for strategy in ['fifo', 'bestfirst']:
+            bop.parse(sentence, -1, strategy)
+            filtered.parse(sentence, -1, strategy)
+            self.assertEqual(sorted(edge.get_prob() for edge in filtered.chart.get_s_edges()),
+                             sorted(edge.get_prob() for edge in bop.chart.get_s_edges()))
+            self.assertTrue(filtered.stats.iterations < bop.stats.iterations)
+
+class LookaheadTest(unittest.TestCase):
+
+    def runTest(self):
+        sentence = 'small mice and cats gave Jack dogs'
+        bop = BottomUpChartParser("sample.pcfg")
+        bop.parse(sentence, -1, 'fifo')
+        expected = sorted(edge.get_prob() for edge in bop.chart.get_s_edges())
+        for left_corner_filter in [False, True]:
+            filtered = BottomUpChartParser("sample.pcfg", left_corner_filter=left_corner_filter,
+                                           lookahead_filter=True)
+            filtered.parse(sentence, -1, 'fifo')
+            self.assertEqual(sorted(edge.get_prob() for edge in filtered.chart.get_s_edges()), expected)
+            self.assertTrue(filtered.stats.iterations < bop.stats.iterations)
+
+class StatsTest(unittest.TestCase):
+
+    def runTest(self):
+        bop = BottomUpChartParser("sample.pcfg")
+        events = dict((event, []) for event in ['create', 'push', 'pop', 'chart'])
+        for event, edges in events.items():
+            bop.add_hook(event, edges.append)
+        stats = bop.parse('big cats and dogs saw Jack with telescopes', -1, 'fifo').get_stats()
+        self.assertTrue(stats is bop.stats)
+        self.assertEqual(stats.parses, 4)
+        self.assertEqual(stats.sentence_length, 8)
+        self.assertEqual(len(events['create']), stats.edges_created)
+        self.assertEqual(len(events['push']), stats.edges_queued)
+        self.assertEqual(events['pop'], events['chart'])
+        self.assertEqual(len(events['chart']), stats.iterations)
+        self.assertEqual(stats.edges_created, stats.edges_queued + stats.duplicates_rejected)
+        self.assertEqual(sum(stats.cell_sizes.values()), stats.chart_edges)
+        self.assertEqual(set(stats.times), set(['preprocess', 'initialize', 'agenda']))
+
+        for event, edges in events.items():
+            bop.remove_hook(event, edges.append)
+        self.assertEqual(bop.hooks, {})
+
+class CacheTest(unittest.TestCase):
+
+    def runTest(self):
+        bop = BottomUpChartParser("sample.pcfg", result_cache_size=2**20, span_cache_size=2**20)
+        sentence = 'big cats and dogs saw Jack with telescopes'
+        parses = sorted(tree.to_penn() for tree in bop.parse(sentence, -1, 'fifo'))
+        result = bop.parse(sentence, -1, 'fifo')
+        self.assertTrue(result.get_stats().cached)
+        self.assertEqual(result.get_stats().iterations, 0)
+        self.assertEqual(sorted(tree.to_penn() for tree in result), parses)
+        self.assertFalse(bop.parse(sentence, 1, 'fifo').get_stats().cached)
+        self.assertFalse(bop.parse(sentence, -1, 'fifo', beam_size=1).get_stats().cached)
+        bop.left_corner_filter = True
+        self.assertFalse(bop.parse(sentence, -1, 'fifo').get_stats().cached)
+        bop.left_corner_filter = False
+        self.assertEqual(bop.result_cache.get_stats()['hits'], 1)
+
+        # Cells of the first sentence are reused for the second one
+        plain = BottomUpChartParser("sample.pcfg")
+        for sentence in ['Jack saw big cats', 'big cats saw Jack with telescopes']:
+            result = bop.parse(sentence, 1, 'cky')
+            tree, plain_tree = result.get_best(), plain.parse(sentence, 1, 'cky').get_best()
+            self.assertEqual(tree.to_penn(), plain_tree.to_penn())
+            self.assertAlmostEqual(tree.get_score(), plain_tree.get_score())
+        stats = result.get_stats()
+        self.assertTrue(stats.spans_cached > 0)
+        self.assertEqual(stats.iterations + stats.spans_cached, plain.stats.iterations)
+
+        cache = LRUCache(10)
+        cache.put('a', 1, 4)
+        cache.put('b', 2, 4)
+        cache.get('a')
+        cache.put('c', 3, 4)
+        self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')), (1, None, 3))
+        self.assertEqual(cache.get_stats()['evictions'], 1)
+
+class TraceTest(unittest.TestCase):
+
+    def runTest(self):
+        bop = BottomUpChartParser("sample.pcfg")
+        output = StringIO()
+        tracer = Tracer(output)
+        tracer.attach(bop, 'big cats and dogs saw Jack with telescopes')
+        stats = bop.parse('big cats and dogs saw Jack with telescopes', -1, 'fifo').get_stats()
+        tracer.detach()
+        self.assertEqual(bop.hooks, {})
+
+        analysis = TraceAnalysis()
+        analysis.read(output.getvalue().splitlines())
+        self.assertEqual(analysis.parses, 1)
+        self.assertEqual(sum(counts['created'] for counts in analysis.rule_counts.values()),
+                         stats.edges_created)
+        self.assertEqual(sum(analysis.span_counts.values()), stats.iterations)
+        self.assertEqual(analysis.rejected, stats.get_edges_rejected())
+        self.assertEqual(analysis.unpopped, 0)
+        self.assertTrue(0 < analysis.unused < stats.iterations)
+
+        # Every parse is traced separately
+        output = StringIO()
+        tracer = Tracer(output)
+        tracer.attach(bop)
+        created = []
+        for sentence in ['Jack saw big cats', 'small mice ate']:
+            created.append(bop.parse(sentence, 1, 'bestfirst').get_stats().edges_created)
+        tracer.detach()
+        lines = output.getvalue().splitlines()
+        starts = [i for i, line in enumerate(lines) if json.loads(line)[0] == 's']
+        self.assertEqual([json.loads(lines[i])[1] for i in starts], ['Jack saw big cats', 'small mice ate'])
+        analysis = TraceAnalysis()
+        for parse, end in enumerate(starts[1:] + [len(lines)]):
+            analysis.read(lines[:end] if parse == 0 else lines[starts[parse]:end])
+            self.assertEqual(analysis.parses, parse+1)
+            self.assertEqual(sum(counts['created'] for counts in analysis.rule_counts.values()),
+                             sum(created[:parse+1]))
+
+class BenchmarkTest(unittest.TestCase):
+
+    def runTest(self):
+        sentences = benchmark.sample_sentences('sample.pcfg', [3, 5], 2, 0)
+        self.assertEqual(sentences, benchmark.sample_sentences('sample.pcfg', [3, 5], 2, 0))
+        self.assertEqual([len(sentence.split()) for sentence in sentences[3] + sentences[5]],
+                         [3, 3, 5, 5])
+        result = benchmark.run_config({'grammar': 'sample.pcfg', 'strategy': 'bestfirst',
+                                       'sentences': sentences[5], 'number_of_parses': 1,
+                                       'time_limit': None, 'log_space': False,
+                                       'binarize': False, 'collapse_unaries': True,
+                                       'left_corner_filter': False, 'lookahead_filter': False})
+        for sentence in result['sentences']:
+            self.assertEqual(sentence['error'], None)
+            self.assertEqual(sentence['parses'], 1)
+            self.assertTrue(sentence['edges_created'] >= sentence['iterations'] > 0)
+
+class BatchTest(unittest.TestCase):
+
+    def runTest(self):
+        lines = ['big cats and dogs saw Jack with telescopes\n', '\n', 'Jack saw\n', 'small mice ate\n']
+        for workers in [1, 2]:
+            output = StringIO()
+            bop_batch.run(bop_batch.read_jobs(lines, -1, 'fifo'), output, 'sample.pcfg',
+                          workers=workers, window=1)
+            results = [json.loads(line) for line in output.getvalue().splitlines()]
+            self.assertEqual([result['id'] for result in results], [0, 1, 2])
+            self.assertEqual([len(result['parses']) for result in results], [4, 0, 1])
+            self.assertEqual(results[1]['error'], 'No parse could be found.')
+            self.assertAlmostEqual(results[0]['parses'][0]['prob'], 3.024e-07)
+
+        # Unexpected errors are reported per sentence
+        output = StringIO()
+        bop_batch.run(bop_batch.read_jobs(lines, 1, 'fifo', 'soon'), output, 'sample.pcfg')
+        results = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(len(results), 3)
+        self.assertTrue(results[0]['error'].startswith('TypeError'))
+
+        # Scores that JSON cannot represent are written as null
+        output = StringIO()
+        bop_batch.write_result({'parses': [{'prob': bop_batch.get_json_score(float('-inf'))}]}, output)
+        self.assertEqual(json.loads(output.getvalue())['parses'][0]['prob'], None)
+
+class ServerTest(unittest.TestCase):
+
+    def runTest(self):
+        tempdir = tempfile.mkdtemp()
+        socket_path = os.path.join(tempdir, 'bop.sock')
+        service = bop_server.ParseService('sample.pcfg')
+        server = bop_server.create_server(service, socket_path=socket_path)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            client = socket.socket(socket.AF_UNIX)
+            client.connect(socket_path)
+            stream = client.makefile()
+            requests = ['{"sentence": "small mice ate", "strategy": "fifo"}', '[]',
+                        '{"sentence": "small mice ate", "timeout": "10"}',
+                        '{"sentence": "small mice ate", "number_of_parses": 0}',
+                        '{"sentence": "small mice ate", "strategy": "depthfirst"}']
+            for request in requests:
+                stream.write(request + '\n')
+                stream.flush()
+            responses = [json.loads(stream.readline()) for request in requests]
+            stream.close()
+            client.close()
+            self.assertAlmostEqual(responses[0]['parses'][0]['prob'], 0.00315)
+            self.assertEqual(responses[1]['error'], 'Request is not a JSON object.')
+            for response, field in zip(responses[2:], ['timeout', 'number_of_parses', 'strategy']):
+                self.assertTrue(response['error'].startswith('Invalid %s.' % field))
+                self.assertEqual(response['parses'], [])
+        finally:
+            server.shutdown()
+            thread.join()
+            server.server_close()
+            service.close()
+            shutil.rmtree(tempdir)
+
 
 if __name__ == "__main__":
     try:
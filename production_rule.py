@@ -1,5 +1,7 @@
 #!/usr/bin/env python
 
+import math
+
 class ProductionRule:
 
     lhs = '' # Left-hand side of the production rule; a single non-terminal
@@ -7,16 +9,25 @@ class ProductionRule:
              # terminals or non-terminals
     prob = -1.0 # Probability of the production rule as specified by
                 # the grammar
+    log_prob = 0.0 # Natural logarithm of prob; -inf for rules with
+                   # probability 0
+    chain = ()  # Labels of the intermediate nodes of a collapsed chain
+                # of unary rules between LHS and RHS, topmost first;
+                # empty for ordinary rules
 
-    def __init__(self, lhs, rhs, prob):
+    def __init__(self, lhs, rhs, prob, chain=()):
         self.lhs = lhs
         self.rhs = rhs
         self.prob = prob
+        self.log_prob = math.log(prob) if prob > 0 else float('-inf')
+        self.chain = chain
 
     def __str__(self):
         '''
         Return string representation of the production rule
         '''
+        if self.chain:
+            return "%s ---> [%s] %s (%s)" % (self.lhs, " ".join(self.chain), " ".join(self.rhs), self.prob)
         return "%s ---> %s (%s)" % (self.lhs, " ".join(self.rhs), self.prob)
 
     def get_lhs(self):
@@ -49,3 +60,16 @@ class ProductionRule:
         Return the probability of the production rule
         '''
         return self.prob
+
+    def get_log_prob(self):
+        '''
+        Return the log-probability of the production rule
+        '''
+        return self.log_prob
+
+    def get_chain(self):
+        '''
+        Return the labels of the nodes between LHS and RHS that were
+        removed by collapsing unary rules into this rule
+        '''
+        return self.chain
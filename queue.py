@@ -1,24 +1,36 @@
 #!/usr/bin/env python
 
+import heapq
+import itertools
+from collections import deque
+
 class Queue:
     ''' This class implements a standard FIFO queue '''
 
     queue = None
+    index = None    # Dictionary: Edge signature (key), queued edge
+                    # (value); used for fast duplicate detection
 
     def __init__(self):
-        self.queue = []
+        self.queue = deque()
+        self.index = {}
 
     def get_next_edge(self):
         '''
         Pop first element from queue
         '''
-        return self.queue.pop() if not self.is_empty() else None
+        if self.is_empty():
+            return None
+        edge = self.queue.popleft()
+        self.remove_edge2index(edge)
+        return edge
 
     def add_edge(self, edge):
         '''
         Push new edge onto queue
         '''
-        self.queue.insert(0, edge)
+        self.queue.append(edge)
+        self.add_edge2index(edge)
 
     def is_empty(self):
         '''
@@ -26,31 +38,163 @@ class Queue:
         '''
         return True if len(self.queue) == 0 else False
 
+    def get_size(self):
+        '''
+        Return the number of edges on the queue
+        '''
+        return len(self.index)
+
     def has_edge(self, edge):
         """
         Check if queue contains the input edge
+
+        Candidates are looked up by edge signature, so this takes
+        constant time regardless of the length of the queue
         """
-        for queued_edge in self.queue:
-            if queued_edge.is_equal_to(edge):
-                return True
-        return False
+        queued_edge = self.index.get(edge.get_signature())
+        return queued_edge is not None and queued_edge.is_equal_to(edge)
+
+    def remove_edge(self, edge):
+        '''
+        Remove edge from queue if it is queued there; returns True
+        if it was
+
+        For the FIFO queue this takes time linear in the length of the
+        queue
+        '''
+        if self.index.get(edge.get_signature()) is not edge:
+            return False
+        self.queue.remove(edge)
+        self.remove_edge2index(edge)
+        return True
+
+    def add_edge2index(self, edge):
+        ''' Internal auxiliary method that adds edge to signature index '''
+        self.index[edge.get_signature()] = edge
+
+    def remove_edge2index(self, edge):
+        ''' Internal auxiliary method that removes edge from signature index '''
+        del self.index[edge.get_signature()]
+
+
+class EdgeHeap:
+    '''
+    This class implements a binary heap of edges ordered by
+    probability, or by some other priority
+
+    Edges with the highest priority are popped first; edges of
+    equal priority are popped in the order in which they were
+    pushed. Edges can be removed from anywhere in the heap in
+    constant time: removal only invalidates the heap entry of the
+    edge, and invalidated entries are discarded once they reach the
+    top of the heap.
+    '''
+
+    heap = None     # List of [priority, sequence number, edge] entries
+                    # kept in heap order; edge is None for removed
+                    # entries
+    entries = None  # Dictionary: Edge (key), its heap entry (value)
+    counter = None  # Source of sequence numbers for tie-breaking
+    size = 0        # Number of edges that have not been removed
+    priority = None # Function returning the priority of an edge;
+                    # defaults to the probability of the edge
+
+    def __init__(self, priority=None):
+        self.heap = []
+        self.entries = {}
+        self.counter = itertools.count()
+        self.size = 0
+        self.priority = priority if priority is not None else self.get_prob
+
+    def get_prob(self, edge):
+        ''' Default priority function '''
+        return edge.get_prob()
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, edge):
+        return edge in self.entries
+
+    def push(self, edge):
+        '''
+        Push edge onto heap in O(log n)
+        '''
+        entry = [-self.priority(edge), next(self.counter), edge]
+        self.entries[edge] = entry
+        heapq.heappush(self.heap, entry)
+        self.size += 1
+
+    def pop(self):
+        '''
+        Pop most probable edge from heap in O(log n), skipping
+        entries of removed edges. Returns None if heap is empty
+        '''
+        while self.heap:
+            edge = heapq.heappop(self.heap)[2]
+            if edge is not None:
+                del self.entries[edge]
+                self.size -= 1
+                return edge
+        return None
 
+    def remove(self, edge):
+        '''
+        Remove edge from heap by invalidating its entry
+        '''
+        self.entries.pop(edge)[2] = None
+        self.size -= 1
 
-from bisect import bisect
 
 class BestFirstQueue(Queue):
     '''
     This class implements a queue sorted according to edge probabilites
     '''
 
+    def __init__(self):
+        self.queue = EdgeHeap()
+        self.index = {}
+
+    def get_next_edge(self):
+        '''
+        Pop most probable element from queue
+        '''
+        if self.is_empty():
+            return None
+        edge = self.queue.pop()
+        self.remove_edge2index(edge)
+        return edge
+
     def add_edge(self, new_edge):
         '''
         Push new edge onto queue
 
         Insert edge into the queue according to its probability
         '''
-        pos = bisect([edge.get_prob() for edge in self.queue], new_edge)
-        self.queue.insert(pos, new_edge)
+        self.queue.push(new_edge)
+        self.add_edge2index(new_edge)
+
+    def remove_edge(self, edge):
+        '''
+        Remove edge from queue if it is queued there; returns True
+        if it was
+        '''
+        if edge not in self.queue:
+            return False
+        self.queue.remove(edge)
+        self.remove_edge2index(edge)
+        return True
+
+class AStarQueue(BestFirstQueue):
+    '''
+    This class implements a queue sorted according to an A* priority,
+    i.e. the probability of an edge combined with an estimate of the
+    probability of the best parse it can become part of
+    '''
+
+    def __init__(self, priority):
+        self.queue = EdgeHeap(priority)
+        self.index = {}
 
 class AltSearchQueue(BestFirstQueue):
     '''
@@ -62,8 +206,9 @@ class AltSearchQueue(BestFirstQueue):
     qdict = None
 
     def __init__(self, size):
-        self.queue = []
-        self.prioq = []
+        self.queue = EdgeHeap()
+        self.prioq = EdgeHeap()
+        self.index = {}
         self.qdict = [[{} for col in range(size)] for row in range(size)]
 
     def get_next_edge(self):
@@ -76,12 +221,15 @@ class AltSearchQueue(BestFirstQueue):
         # Pop from priority queue if it is active and not empty
         if self.prioq_active:
             if not self.is_priority_empty():
-                return self.prioq.pop()
+                edge = self.prioq.pop()
+                self.remove_edge2index(edge)
+                return edge
             else:   # If priority queue is empty, deactivate it
                 self.prioq_active = False
         if not self.is_empty(): # Otherwise pop from base queue and clean qdict
             edge = self.queue.pop()
             self.remove_edge2dict(edge)
+            self.remove_edge2index(edge)
             return edge
         else:
             return None
@@ -91,12 +239,11 @@ class AltSearchQueue(BestFirstQueue):
         Push new edge onto active queue
         '''
         if self.prioq_active:
-            pos = bisect([edge.get_prob() for edge in self.prioq], new_edge)
-            self.prioq.insert(pos, new_edge)
+            self.prioq.push(new_edge)
         else:
-            pos = bisect([edge.get_prob() for edge in self.queue], new_edge)
-            self.queue.insert(pos, new_edge)
+            self.queue.push(new_edge)
             self.add_edge2dict(new_edge)
+        self.add_edge2index(new_edge)
 
     def is_empty(self):
         '''
@@ -104,17 +251,20 @@ class AltSearchQueue(BestFirstQueue):
         '''
         return True if (len(self.queue) + len(self.prioq)) == 0 else False
 
-    def has_edge(self, edge):
-        """
-        Check if either queue contains the input edge
-        """
-        for queued_edge in self.queue:
-            if queued_edge.is_equal_to(edge):
-                return True
-        for queued_edge in self.prioq:
-            if queued_edge.is_equal_to(edge):
-                return True
-        return False
+    def remove_edge(self, edge):
+        '''
+        Remove edge from whichever queue it is queued in; returns True
+        if it was queued
+        '''
+        if edge in self.prioq:
+            self.prioq.remove(edge)
+        elif edge in self.queue:
+            self.queue.remove(edge)
+            self.remove_edge2dict(edge)
+        else:
+            return False
+        self.remove_edge2index(edge)
+        return True
 
     def get_next_particular_edge(self, lhs, start, end):
         '''
@@ -125,6 +275,7 @@ class AltSearchQueue(BestFirstQueue):
         if lhs in self.qdict[start][end] and len(self.qdict[start][end][lhs]) > 0:
             edge = self.qdict[start][end][lhs].pop()
             self.queue.remove(edge)
+            self.remove_edge2index(edge)
             return edge
         else:
             return None
@@ -151,11 +302,9 @@ class AltSearchQueue(BestFirstQueue):
             start = new_edge.get_start()
             end = new_edge.get_end()
             lhs = new_edge.get_prod_rule().get_lhs()
-            if lhs in self.qdict[start][end]:
-                pos = bisect([edge.get_prob() for edge in self.qdict[start][end][lhs]], new_edge)
-                self.qdict[start][end][lhs].insert(pos, new_edge)
-            else:
-                self.qdict[start][end][lhs] = [new_edge]
+            if lhs not in self.qdict[start][end]:
+                self.qdict[start][end][lhs] = EdgeHeap()
+            self.qdict[start][end][lhs].push(new_edge)
 
     def remove_edge2dict(self, edge):
         ''' Internal auxiliary method that removes edge from queue dictionary '''
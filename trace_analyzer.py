@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+
+'''
+Analyze traces of the agenda loop written by a Tracer (see tracer.py)
+
+Reports, over all parses in a trace:
+
+- the hottest production rules, i.e. those with the most edges
+  created, along with how many of these were queued, added to the
+  chart and wasted
+- the hottest spans, i.e. those with the most edges added to the chart
+- wasted edges, in three kinds: edges rejected before being queued
+  (duplicates, pruned), edges queued but never added to the chart,
+  and edges added to the chart that no other edge was built from and
+  that are not parses
+
+Example:
+    python trace_analyzer.py trace.jsonl -n 20
+'''
+
+import argparse
+import json
+import sys
+from grammar import GOAL_SYMBOL
+
+class TraceAnalysis:
+    '''
+    This class accumulates the counts reported by the analyzer
+    '''
+
+    parses = 0
+    rules = None    # Dictionary: rule id (key), (LHS, RHS) (value)
+    rule_counts = None  # Dictionary: rule id (key), dictionary of
+                        # counts: created, queued, popped, wasted (value)
+    span_counts = None  # Dictionary: (start, end) (key), number of
+                        # edges added to the chart (value)
+    rejected = 0    # Edges created but never queued
+    unpopped = 0    # Edges queued but never added to the chart
+    unused = 0      # Edges added to the chart but never used
+
+    def __init__(self):
+        self.rules = {}
+        self.rule_counts = {}
+        self.span_counts = {}
+
+    def read(self, lines):
+        '''
+        Read a trace and add its events to the counts
+        '''
+        edges = None
+        for line in lines:
+            record = json.loads(line)
+            kind = record[0]
+            if kind == 'r':
+                self.rules[record[1]] = (record[2], record[3])
+            elif kind == 's':
+                edges = {}
+            elif kind == 'c':
+                edges[record[1]] = record[2:] + [False, False, False]
+            elif kind == 'p':
+                edges[record[1]][7] = True
+            elif kind == 'o':
+                edges[record[1]][8] = True
+            elif kind == 'e':
+                self.add_parse(edges, record[1])
+                edges = None
+
+    def add_parse(self, edges, stats):
+        '''
+        Add the counts of a single parse
+
+        edges maps edge ids to lists [rule id, start, end, dot,
+        prev id, dtr id, score, queued, popped, used].
+        '''
+        self.parses += 1
+        for edge in edges.values():
+            for tail in edge[4:6]:
+                if tail is not None:
+                    edges[tail][9] = True
+        length = stats['sentence_length'] if stats is not None else None
+
+        for rule_id, start, end, dot, prev, dtr, score, queued, popped, used in edges.values():
+            counts = self.rule_counts.setdefault(rule_id, {'created': 0, 'queued': 0,
+                                                           'popped': 0, 'wasted': 0})
+            counts['created'] += 1
+            if queued:
+                counts['queued'] += 1
+            if popped:
+                counts['popped'] += 1
+                self.span_counts[(start, end)] = self.span_counts.get((start, end), 0) + 1
+            if not queued:
+                self.rejected += 1
+            elif not popped:
+                self.unpopped += 1
+            elif not used and not self.is_parse(rule_id, start, end, dot, length):
+                self.unused += 1
+            else:
+                continue
+            counts['wasted'] += 1
+
+    def is_parse(self, rule_id, start, end, dot, length):
+        '''
+        Check whether an edge is a complete edge for the goal symbol
+        spanning the whole sentence
+        '''
+        lhs, rhs = self.rules[rule_id]
+        return lhs == GOAL_SYMBOL and start == 0 and end == length and dot == len(rhs)
+
+    def get_hot_rules(self, n):
+        '''
+        Return the n rules with the most edges created, as a list of
+        (rule, counts)
+        '''
+        ranked = sorted(self.rule_counts.items(), key=lambda item: item[1]['created'], reverse=True)
+        return [('%s ---> %s' % (self.rules[rule_id][0], ' '.join(self.rules[rule_id][1])), counts) \
+                for rule_id, counts in ranked[:n]]
+
+    def get_hot_spans(self, n):
+        '''
+        Return the n spans with the most edges added to the chart, as
+        a list of ((start, end), number of edges)
+        '''
+        return sorted(self.span_counts.items(), key=lambda item: item[1], reverse=True)[:n]
+
+    def as_dict(self, n):
+        return {'parses': self.parses,
+                'hot_rules': [dict(counts, rule=rule) for rule, counts in self.get_hot_rules(n)],
+                'hot_spans': [{'start': start, 'end': end, 'edges': edges} \
+                              for (start, end), edges in self.get_hot_spans(n)],
+                'wasted': {'rejected': self.rejected,
+                           'never_popped': self.unpopped,
+                           'never_used': self.unused}}
+
+    def print_report(self, n):
+        print '%s parses analyzed' % self.parses
+        print '\nHottest rules (created / queued / popped / wasted):'
+        for rule, counts in self.get_hot_rules(n):
+            print '%8d %8d %8d %8d   %s' % (counts['created'], counts['queued'],
+                                            counts['popped'], counts['wasted'], rule)
+        print '\nHottest spans (edges in chart):'
+        for (start, end), edges in self.get_hot_spans(n):
+            print '%8d   %s:%s' % (edges, start, end)
+        print '\nWasted edges:'
+        print '%8d   rejected before being queued' % self.rejected
+        print '%8d   queued but never added to the chart' % self.unpopped
+        print '%8d   added to the chart but never used' % self.unused
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description='Analyze traces of the agenda loop.')
+    arg_parser.add_argument('trace', nargs='?', default='-',
+                            help='trace file (default: stdin)')
+    arg_parser.add_argument('-n', '--top', type=int, default=10,
+                            help='number of rules and spans to report (default: 10)')
+    arg_parser.add_argument('--json', action='store_true',
+                            help='write the report as JSON')
+    args = arg_parser.parse_args(argv)
+
+    analysis = TraceAnalysis()
+    if args.trace == '-':
+        analysis.read(sys.stdin)
+    else:
+        with open(args.trace) as f:
+            analysis.read(f)
+    if args.json:
+        print json.dumps(analysis.as_dict(args.top), indent=2, sort_keys=True)
+    else:
+        analysis.print_report(args.top)
+
+
+if __name__ == '__main__':
+    main()
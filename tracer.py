@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+import json
+
+class Tracer:
+    '''
+    This class records the agenda loop of a parser as a stream of
+    events, for offline analysis with trace_analyzer.py
+
+    The tracer registers hooks with the parser (see
+    BottomUpChartParser.add_hook) only while it is attached, so a
+    parser without a tracer does not pay for tracing at all. Events
+    are written as one compact JSON list per line:
+
+    ["s", label]            start of a parse, with the label given
+                            to attach, or else the sentence
+    ["r", rule id, LHS, RHS, probability]
+                            first use of a production rule
+    ["c", edge id, rule id, start, end, dot, prev id, dtr id, score]
+                            an edge was created; prev id and dtr id
+                            refer to the edges it was built from, or
+                            are null
+    ["p", edge id]          the edge was pushed to the queue
+    ["o", edge id]          the edge was popped from the queue and
+                            added to the chart
+    ["e", statistics]       end of the parse, with the statistics of
+                            the parse (see ParseStats.as_dict)
+
+    Every parse run while the tracer is attached is traced
+    separately. Edge ids are only unique within one parse; rule ids
+    are unique within the whole trace.
+    '''
+
+    output = None   # File-like object the trace is written to
+    parser = None   # Parser the tracer is attached to, or None
+    label = None    # Label written at the start of every parse, or
+                    # None to write the sentence
+    edge_ids = None # Dictionary: Edge (key), edge id (value); only
+                    # holds the edges of the current parse
+    rule_ids = None # Dictionary: Production rule (key), rule id (value)
+
+    def __init__(self, output):
+        self.output = output
+        self.rule_ids = {}
+
+    def attach(self, parser, label=None):
+        '''
+        Start tracing the parses of a parser; label (e.g. the name of
+        a corpus) is written at the start of every parse instead of
+        the sentence
+        '''
+        self.parser = parser
+        self.label = label
+        self.edge_ids = {}
+        parser.add_hook('start', self.on_start)
+        parser.add_hook('create', self.on_create)
+        parser.add_hook('push', self.on_push)
+        parser.add_hook('pop', self.on_pop)
+        parser.add_hook('finish', self.on_finish)
+
+    def detach(self):
+        '''
+        Stop tracing
+        '''
+        parser = self.parser
+        parser.remove_hook('start', self.on_start)
+        parser.remove_hook('create', self.on_create)
+        parser.remove_hook('push', self.on_push)
+        parser.remove_hook('pop', self.on_pop)
+        parser.remove_hook('finish', self.on_finish)
+        self.output.flush()
+        self.parser = None
+        self.edge_ids = None
+
+
+    ### START internal auxiliary methods ###
+
+    def write(self, record):
+        self.output.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+    def get_rule_id(self, prod_rule):
+        '''
+        Return the id of a production rule, writing the rule to the
+        trace on first use
+        '''
+        rule_id = self.rule_ids.get(prod_rule)
+        if rule_id is None:
+            rule_id = self.rule_ids[prod_rule] = len(self.rule_ids)
+            self.write(['r', rule_id, prod_rule.get_lhs(), prod_rule.get_rhs(),
+                        prod_rule.get_prob()])
+        return rule_id
+
+    def on_start(self, tokens):
+        self.edge_ids = {}
+        self.write(['s', self.label if self.label is not None else ' '.join(tokens)])
+
+    def on_finish(self, stats):
+        self.write(['e', stats.as_dict()])
+        self.edge_ids = {}
+
+    def on_create(self, edge):
+        edge_id = self.edge_ids[edge] = len(self.edge_ids)
+        self.write(['c', edge_id, self.get_rule_id(edge.get_prod_rule()),
+                    edge.get_start(), edge.get_end(), edge.get_dot(),
+                    self.edge_ids.get(edge.get_prev()), self.edge_ids.get(edge.get_last_dtr()),
+                    edge.get_prob()])
+
+    def on_push(self, edge):
+        self.write(['p', self.edge_ids[edge]])
+
+    def on_pop(self, edge):
+        self.write(['o', self.edge_ids[edge]])